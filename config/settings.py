@@ -1,10 +1,47 @@
 # settings.py
 
 USE_4BIT = True  # If True, load model in 4-bit precision
-CACHE_SIZE = 64  # For caching responses
+
+# Response cache (memory tier in front of a persistent SQLite tier)
+RESPONSE_CACHE_MEMORY_BYTES = 32 * 1024 * 1024  # Memory tier budget in bytes
+RESPONSE_CACHE_PATH = ".cache/response_cache.sqlite3"  # Set to None to disable the disk tier
+RESPONSE_CACHE_DISK_BYTES = 256 * 1024 * 1024  # Disk tier budget; least recently used entries go first
+RESPONSE_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60  # Cached responses expire after a week
 
 # Whisper config (optional)
-WHISPER_MODEL = "medium.en"  # or "tiny.en", "small.en", etc.
+WHISPER_MODEL = "base"  # or "tiny.en", "small.en", "medium.en", etc.
+
+# Speech-to-text backend: "whisper" (openai-whisper, fp32 on CPU) or "faster-whisper"
+# (CTranslate2, int8-quantized on CPU; typically 3-4x faster). Compare them with
+# `python -m src.audio_benchmark test_audio.wav --reference "<what was said>"`.
+STT_BACKEND = "whisper"
+FASTER_WHISPER_DEVICE = "cpu"
+FASTER_WHISPER_COMPUTE_TYPE = "int8"  # "int8", "int8_float16" (GPU), "float16" (GPU) or "float32"
+STT_CPU_THREADS = 0  # CPU threads used for inference (0 = the engine's default)
+
+# Speech-to-text service (preloaded model instances fed from a bounded queue)
+STT_WORKERS = 1  # Model instances (one thread each); every instance holds its own copy of the model in RAM
+STT_QUEUE_SIZE = 16  # Max queued transcription windows before new ones are rejected
+STT_SUBMIT_TIMEOUT = 10  # Seconds to wait for a queue slot before giving up
+STT_WARMUP_SECONDS = 1  # Length of the silent clip each model transcribes at startup (0 = no warm-up)
+
+# Transcript cache (keyed by a hash of the decoded audio plus the STT backend, model and options)
+TRANSCRIPT_CACHE_MEMORY_BYTES = 4 * 1024 * 1024  # Memory tier budget in bytes
+TRANSCRIPT_CACHE_PATH = ".cache/transcript_cache.sqlite3"  # Set to None to disable the disk tier
+TRANSCRIPT_CACHE_DISK_BYTES = 64 * 1024 * 1024  # Disk tier budget; least recently used entries go first
+TRANSCRIPT_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60  # Cached transcripts expire after a month
+
+# Scratch space (per-request temp directories, see src/scratch.py)
+SCRATCH_USE_TMPFS = True  # Put scratch files in /dev/shm (RAM) when it exists and has room
+SCRATCH_TMPFS_MIN_FREE_BYTES = 512 * 1024 * 1024  # Otherwise fall back to the system temp directory
+SCRATCH_TMPFS_MAX_FILE_BYTES = 64 * 1024 * 1024  # Larger uploads are kept on disk rather than copied into RAM
+SCRATCH_MAX_BYTES = 1024 * 1024 * 1024  # Cap on all scratch files; the oldest finished ones are deleted first
+SCRATCH_MAX_AGE_SECONDS = 60 * 60  # Workspaces older than this were left by a crashed request
+SCRATCH_REAP_SECONDS = 5 * 60  # How often the background reaper runs
+
+# Progress tracking (SQLite in WAL mode, see src/tracking_store.py)
+TRACKING_DB_PATH = "config/task_tracking.sqlite3"
+TRACKING_JSON_PATH = "config/task_tracking.json"  # Legacy store; imported into the database once, on first start
 
 # TTS config (optional)
 TTS_VOICE = "en-us-amy"  # Example voice ID (depends on the TTS library)
@@ -12,10 +49,59 @@ TTS_VOICE = "en-us-amy"  # Example voice ID (depends on the TTS library)
 MODEL_NAME = "llama3.2:latest"  # The model label you use in Ollama
 OLLAMA_SERVER_URL = "http://127.0.0.1:11434/api/"  # Default Ollama URL
 
+# Ollama HTTP client (shared keep-alive connection pool)
+OLLAMA_POOL_SIZE = 8  # Max pooled keep-alive connections per backend
+OLLAMA_POOL_TIMEOUT = 30  # Max seconds to wait for a free pooled connection before failing the request
+OLLAMA_CONNECT_TIMEOUT = 3.05  # Seconds to establish a TCP connection
+OLLAMA_READ_TIMEOUT = 120  # Max seconds to wait between streamed chunks
+OLLAMA_MAX_RETRIES = 3  # Retries on connection errors and resets
+OLLAMA_RETRY_BACKOFF = 0.5  # Backoff factor in seconds (0.5, 1, 2, ...)
+
+# Model residency (keep the model loaded in Ollama between requests)
+OLLAMA_KEEP_ALIVE = "24h"  # How long Ollama keeps the model loaded after a request (-1 = forever)
+RESIDENCY_POLL_SECONDS = 60  # How often to check /api/ps and re-warm an evicted model
+WARMUP_PROMPT = "Hello"  # Prompt for the one-token warm-up generation (loads the model at CONTEXT_WINDOW_SIZES[0])
+
+# Generation profiles (Ollama "options" per task)
+# num_predict caps the generated tokens; stop sequences end the generation early.
+GENERATION_PROFILES = {
+    "chat": {"num_predict": 300, "temperature": 0.7, "stop": ["\nUser Message:", "\nUser:"]},
+    "impromptu": {"num_predict": 900, "temperature": 0.5, "stop": ["\n🗣 **USER RESPONSE"]},
+    "storytelling": {"num_predict": 900, "temperature": 0.5, "stop": ["\n🎙️ **USER’S SPOKEN RESPONSE"]},
+    "conflict": {"num_predict": 900, "temperature": 0.5, "stop": ["\n🗣 **USER RESPONSE"]},
+    "presentation": {"num_predict": 1000, "temperature": 0.5, "stop": ["\n📜 **User's Presentation"]},
+}
+DEFAULT_GENERATION_PROFILE = "chat"
+
+# Context window (num_ctx). Ollama reloads the model whenever num_ctx changes, so the warm-up,
+# prompt prefills and every request use the first size, which fits chat, critiques and
+# presentations of normal length. Only a prompt + num_predict that doesn't fit moves up to the
+# next size (a reload, but better than a silently truncated prompt).
+CONTEXT_WINDOW_SIZES = (4096, 8192)
+CONTEXT_TOKEN_MARGIN = 64  # Headroom for tokenizer differences (tiktoken vs. the model's own)
+
+# Inference scheduler (persistent, bounded queue in front of Ollama)
+INFERENCE_CONCURRENCY = 2  # Max concurrent in-flight Ollama requests
+INFERENCE_QUEUE_SIZE = 64  # Max queued requests before new ones are rejected
+INFERENCE_SUBMIT_TIMEOUT = 5  # Seconds to wait for a queue slot before giving up
+
+# Metrics (Prometheus text format, scraped from http://METRICS_HOST:METRICS_PORT/metrics)
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"  # Local only; use "0.0.0.0" to let a Prometheus server on another host scrape it
+METRICS_PORT = 9464
+
+# Request tracing (Chrome trace-event JSON files, viewable in chrome://tracing or ui.perfetto.dev)
+TRACING_ENABLED = True
+TRACE_SAMPLE_RATE = 0.05  # Fraction of requests whose trace is written
+TRACE_SLOW_SECONDS = 20  # Requests slower than this are always written, sampled or not
+TRACE_DIR = ".cache/traces"
+TRACE_MAX_FILES = 500  # Oldest trace files are deleted beyond this
+
 
 # Training prompts for skill modules
 PROMPTS = {
     "impromptu_speaking": {
+        "profile": "impromptu",
         "topics": [
             "The most important quality in a leader",
             "How technology has changed the way we communicate",
@@ -44,14 +130,13 @@ PROMPTS = {
             "🎯 **Tips:** Use **real-life examples**, stay **concise**, and be **engaging**.\n\n"
             "🏆 **Evaluation Criteria:** Clarity, fluency, structure, and persuasiveness."
         ),
+        # For voice answers, this rubric question is swapped for the measured delivery ({delivery})
+        "measured_delivery": (
+            "Did your speech flow smoothly without excessive pauses or hesitations?",
+            "Score it from the measured delivery, not the transcript: {delivery}.",
+        ),
         "critique_prompt": """
-🎙️✨ As your **expert Impromptu Speaking Coach**, I will provide a **detailed and transformative critique** of your response to the following topic:
-
-📝 **TOPIC:**  
-*_"{challenge}"_*
-
-🗣 **USER RESPONSE (Transcription):**  
-{user_input}
+🎙️✨ As your **expert Impromptu Speaking Coach**, I will provide a **detailed and transformative critique** of the response to the topic given at the end of this brief:
 
 ---
 
@@ -88,9 +173,18 @@ Each category will be **scored out of 10**, followed by your **total average sco
 💬 **Bonus:** If relevant, I will also suggest **speech frameworks (like PREP, STAR, or Rule of Three), vocal warm-ups, and mindset shifts** to boost your impromptu speaking confidence.  
 
 🌟 **Let’s refine your ability to think on your feet and speak with confidence, clarity, and impact!** 🚀🎙️✨
+
+---
+
+📝 **TOPIC:**  
+*_"{challenge}"_*
+
+🗣 **USER RESPONSE (Transcription):**  
+{user_input}
         """
     },
     "storytelling": {
+        "profile": "storytelling",
         "topics": [
             "Tell a short story about an unexpected adventure.",
             "Share a fictional story about overcoming fear."
@@ -101,14 +195,12 @@ Each category will be **scored out of 10**, followed by your **total average sco
             "🎯 **Tips:** Focus on **narrative flow**, **character depth**, and **audience engagement**.\n\n"
             "🏆 **Evaluation Criteria:** Narrative structure, character development, emotional engagement, creativity, and delivery."
         ),
+        "measured_delivery": (
+            "Does your tone, variation, and delivery captivate the listener?",
+            "Does your tone and variation captivate the listener? Judge pacing from the measured delivery: {delivery}.",
+        ),
         "critique_prompt": """
-🎤✨ As your **expert Verbal Communication Skills Trainer**, I will provide a **detailed and transformative critique** of your spoken delivery based on the following scenario:
-
-📝 **SPEAKING SCENARIO / PROMPT:**  
-*_"{challenge}"_*
-
-🎙️ **USER’S SPOKEN RESPONSE:**  
-{user_input}
+🎤✨ As your **expert Verbal Communication Skills Trainer**, I will provide a **detailed and transformative critique** of the spoken delivery for the scenario given at the end of this brief:
 
 ---
 
@@ -144,9 +236,18 @@ Each category will be **scored out of 10**, followed by your **total average sco
 💬 **Bonus:** If relevant, I will also suggest **real-world applications, storytelling techniques, and power phrases** to enhance your delivery.  
 
 🌟 **Let’s unlock the full potential of your voice and transform you into a world-class communicator!** 🚀🎙️✨
+
+---
+
+📝 **SPEAKING SCENARIO / PROMPT:**  
+*_"{challenge}"_*
+
+🎙️ **USER’S SPOKEN RESPONSE:**  
+{user_input}
         """
     },
     "conflict_resolution": {
+        "profile": "conflict",
         "topics": [
             "Your teammate is frustrated with missed deadlines. How do you respond?",
             "You and your friend disagree about a shared expense. Resolve politely."
@@ -158,13 +259,7 @@ Each category will be **scored out of 10**, followed by your **total average sco
             "🏆 **Evaluation Criteria:** Empathy, problem-solving, communication clarity, persuasiveness, and resolution effectiveness."
         ),
         "critique_prompt": """
-🤝✨ As your **expert Conflict Resolution Coach**, I will provide a **detailed and transformative critique** of your response to the following conflict scenario:
-
-📜 **SCENARIO:**  
-*_"{challenge}"_*
-
-🗣 **USER RESPONSE:**  
-{user_input}
+🤝✨ As your **expert Conflict Resolution Coach**, I will provide a **detailed and transformative critique** of the response to the conflict scenario given at the end of this brief:
 
 ---
 
@@ -201,10 +296,69 @@ Each category will be **scored out of 10**, followed by your **total average sco
 💬 **Bonus:** If relevant, I will also suggest **real-world conflict resolution scenarios, scripts for difficult conversations, and leadership techniques** to enhance your skills.  
 
 🌟 **Let’s transform your conflict resolution abilities and turn challenges into opportunities for collaboration and growth!** 🚀🤝✨
+
+---
+
+📜 **SCENARIO:**  
+*_"{challenge}"_*
+
+🗣 **USER RESPONSE:**  
+{user_input}
         """
     }
 }
 
+# Scoring mode for skill training critiques:
+#   "text" - the critique is free-form prose and scores are parsed from its "X/10" lines
+#   "json" - Ollama returns JSON constrained to a per-module schema, which is validated
+SCORING_MODE = "text"
+
+# In "text" mode, stop generating as soon as the final score breakdown has all five
+# scores instead of letting the model continue with bonus sections and sign-offs.
+EARLY_STOP_ON_SCORES = True
+
+# The five scored criteria per module (JSON key -> display label)
+SCORING_CRITERIA = {
+    "impromptu_speaking": {
+        "structure_organization": "Structure & Organization",
+        "clarity_coherence": "Clarity & Coherence",
+        "examples_evidence": "Use of Examples & Evidence",
+        "fluency_delivery": "Fluency & Natural Delivery",
+        "impact_persuasiveness": "Overall Impact & Persuasiveness",
+    },
+    "storytelling": {
+        "clarity_articulation": "Clarity & Articulation",
+        "confidence_presence": "Confidence & Presence",
+        "engagement_energy": "Engagement & Energy",
+        "structure_coherence": "Structure & Coherence",
+        "persuasiveness_impact": "Persuasiveness & Impact",
+    },
+    "conflict_resolution": {
+        "empathy_understanding": "Empathy & Understanding",
+        "problem_solving": "Problem-Solving Approach",
+        "communication_clarity": "Communication Clarity",
+        "persuasiveness_influence": "Persuasiveness & Influence",
+        "resolution_effectiveness": "Resolution Effectiveness",
+    },
+}
+
+SCORING_JSON_INSTRUCTIONS = """
+---
+
+Respond with a JSON object only. Score each criterion from 0 to 10 under "scores" using the keys {criteria}.
+Put the key strengths under "strengths", the areas for improvement under "improvements",
+actionable strategies under "suggestions" (each a list of short strings) and a one-paragraph "summary".
+"""
+
+SCORING_REPAIR_PROMPT = """
+The JSON evaluation below does not match the required format:
+{problems}
+
+Return the corrected JSON object only. Keep the original scores and feedback wherever they are valid.
+
+{response}
+"""
+
 # Templates from CommunicationPrompts class
 COMMUNICATION_PROMPTS = {
     "general_communication_coach": """
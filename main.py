@@ -1,22 +1,26 @@
 # Gradio UI script
 import time
+import asyncio
 import threading
 import gradio as gr
 import os
-import json
 import pandas as pd
-from src.model_manager import generate_response
-from src.conversation import get_chat_feedback
-from src.skill_training import get_random_training_prompt, run_impromptu_speaking, run_storytelling, run_conflict_resolution, update_tracking
-from src.voice_interface import process_voice_input, transcribe_audio
-from src.presentation_assessment import assess_presentation
+from src.model_manager import start_scheduler
+from src.conversation import stream_chat_feedback
+from src.skill_training import get_random_training_prompt, prefill_critique, stream_skill_evaluation, update_tracking
+from src.voice_interface import StreamingTranscriber, start_stt_service, stream_transcription, transcribe_audio_detailed
+from src.presentation_assessment import stream_presentation_assessment
+from src.model_residency import get_residency_manager, start_residency_manager
+from src.metrics import start_metrics_server
+from src.scratch import scratch_workspace, start_scratch_reaper
+from src.tracing import traced_request
+from src.speech_analytics import summarize_speech
+from src.tracking_store import get_tracking_store
+from config.settings import METRICS_ENABLED
 
 selected_topic = None
 selected_time_limit = None
 
-# Path to the task tracking JSON file
-TRACKING_FILE = "config/task_tracking.json"
-
 def start_countdown(time_limit, countdown_callback, submit_callback):
     for remaining in range(time_limit, 0, -1):
         time.sleep(1)
@@ -29,177 +33,207 @@ def generate_challenge(module: str) -> tuple:
     challenge_text = f"🎭 **Your Challenge:** *{prompt['challenge']}*\n\n{prompt['instructions']}"
     global selected_challenge, selected_time_limit
     selected_challenge, selected_time_limit = prompt['challenge'], prompt['time_limit_seconds']
+    prefill_critique(module, selected_challenge)  # Warm Ollama's prompt cache while the user answers
     return challenge_text, ""
 
 # Common function for processing voice input and updating chat history
-def process_voice_input_and_chat(audio_path, chat_history):
+def process_voice_input_and_chat(audio_path, chat_history, request: gr.Request = None):
     if audio_path is None:
         chat_history.append({"role": "user", "content": "Error: No audio provided."})
-        return chat_history, None
+        return chat_history, None, None
     chat_history.append({"role": "user", "content": "Transcribing..."})
-    transcript = transcribe_audio(audio_path)
+    try:
+        with scratch_workspace("voice") as workspace:
+            # The session identifies the microphone, so its noise profile can be reused across recordings
+            result = transcribe_audio_detailed(workspace.adopt(audio_path),
+                                               profile_key=request.session_hash if request else None)
+    except OSError as e:
+        result = {"text": f"Error: {e}"}
+    transcript = result["text"]
     if not transcript or transcript.startswith("Error"):
         chat_history[-1] = {"role": "user", "content": "Error: Could not transcribe audio."}
-        return chat_history, None
+        return chat_history, None, None
     chat_history[-1] = {"role": "user", "content": transcript}
-    return chat_history, transcript
+    return chat_history, transcript, result.get("analytics")
 
 # Chat with Coach (Text and Voice)
-def chat_with_coach_text(user_input, history):
+@traced_request("chat_text")
+async def chat_with_coach_text(user_input, history):
     if not user_input.strip():
-        return history
+        yield history
+        return
     history.append({"role": "user", "content": user_input})
     history.append({"role": "assistant", "content": "Thinking..."})
-    response = get_chat_feedback(user_input)
-    history[-1] = {"role": "assistant", "content": response}
-    return history
-
-def chat_with_coach_voice(audio_path, history):
-    history, transcript = process_voice_input_and_chat(audio_path, history)
+    yield history
+    async for response in stream_chat_feedback(user_input):
+        history[-1] = {"role": "assistant", "content": response}
+        yield history
+
+@traced_request("chat_voice")
+async def chat_with_coach_voice(audio_path, history, request: gr.Request):
+    # Transcription is CPU-bound; keep it off the event loop
+    history, transcript, _ = await asyncio.to_thread(process_voice_input_and_chat, audio_path, history, request)
     if not transcript:
-        return history
+        yield history
+        return
     history.append({"role": "assistant", "content": "Thinking..."})
-    response = get_chat_feedback(transcript)
-    history[-1] = {"role": "assistant", "content": response}
-    return history
+    yield history
+    async for response in stream_chat_feedback(transcript):
+        history[-1] = {"role": "assistant", "content": response}
+        yield history
 
 # Skill Training (Text and Voice)
-# Skill Training (Text and Voice)
-def skill_training_text(module: str, user_input: str, history) -> list:
+SKILL_FEEDBACK_HEADERS = {
+    "Impromptu Speaking": "**🔹 Topic:**",
+    "Storytelling": "**📖 Story Prompt:**",
+    "Conflict Resolution": "**⚖️ Conflict Scenario:**",
+}
+
+async def stream_skill_feedback(module: str, user_input: str, history, speech_analytics: dict = None):
+    """Streams the coach's evaluation into the last history message, then updates tracking."""
+    if module not in SKILL_FEEDBACK_HEADERS:
+        history[-1] = {"role": "assistant", "content": "‍🏫 **Coach:** Error: Invalid module selected."}
+        yield history
+        return
+
+    feedback = {}
+    async for feedback in stream_skill_evaluation(module, user_input, selected_challenge, speech_analytics, selected_time_limit):
+        eval_text = f"‍🏫 **Coach:**\n{SKILL_FEEDBACK_HEADERS[module]} {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
+        if feedback.get("speech_analytics"):
+            eval_text += f"\n\n### ⏱ **Delivery Metrics**\n{summarize_speech(feedback['speech_analytics'])}"
+        history[-1] = {"role": "assistant", "content": eval_text}
+        yield history
+
+    # Update tracking
+    await asyncio.to_thread(update_tracking, module, selected_challenge, user_input, feedback)
+
+@traced_request("skill_training_text")
+async def skill_training_text(module: str, user_input: str, history):
     if selected_challenge is None or selected_time_limit is None:
         history.append(
             {"role": "user", "content": "Error: Please generate a challenge first by clicking 'Get Your Challenge'."})
-        return history
+        yield history
+        return
 
     # Format the user input with the desired label and icon
     history.append({"role": "user", "content": f"👤 **You:** {user_input}"})
     history.append({"role": "assistant", "content": "‍🏫 **Coach:** Thinking..."})
-
-    if module == "Impromptu Speaking":
-        feedback = run_impromptu_speaking(user_input, selected_challenge, selected_time_limit)
-        eval_text = f"‍🏫 **Coach:**\n**🔹 Topic:** {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
-    elif module == "Storytelling":
-        feedback = run_storytelling(user_input, selected_challenge)
-        eval_text = f"‍🏫 **Coach:**\n**📖 Story Prompt:** {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
-    elif module == "Conflict Resolution":
-        feedback = run_conflict_resolution(user_input, selected_challenge)
-        eval_text = f"‍🏫 **Coach:**\n**⚖️ Conflict Scenario:** {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
-    else:
-        history[-1] = {"role": "assistant", "content": "‍🏫 **Coach:** Error: Invalid module selected."}
-        return history
-
-    history[-1] = {"role": "assistant", "content": eval_text}
-    # Update tracking
-    update_tracking(module, selected_challenge, user_input, feedback)
-    return history
+    yield history
+    async for history in stream_skill_feedback(module, user_input, history):
+        yield history
 
 
-def skill_training_voice(module: str, audio_path, history) -> list:
-    history, transcript = process_voice_input_and_chat(audio_path, history)
+async def stream_skill_voice_feedback(module: str, transcript, history, speech_analytics: dict = None):
+    """Shows a transcribed answer in place of the 'Transcribing...' message and streams the evaluation."""
     if not transcript:
-        return history
+        yield history
+        return
     if selected_challenge is None or selected_time_limit is None:
         history.append({"role": "assistant",
                         "content": "‍🏫 **Coach:** Error: Please generate a challenge first by clicking 'Get Your Challenge'."})
-        return history
+        yield history
+        return
 
     # Format the user input with the desired label and icon
     history[-1] = {"role": "user", "content": f"👤 **You:** {transcript}"}
     history.append({"role": "assistant", "content": "‍🏫 **Coach:** Thinking..."})
-
-    if module == "Impromptu Speaking":
-        feedback = run_impromptu_speaking(transcript, selected_challenge, selected_time_limit)
-        eval_text = f"‍🏫 **Coach:**\n**🔹 Topic:** {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
-    elif module == "Storytelling":
-        feedback = run_storytelling(transcript, selected_challenge)
-        eval_text = f"‍🏫 **Coach:**\n**📖 Story Prompt:** {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
-    elif module == "Conflict Resolution":
-        feedback = run_conflict_resolution(transcript, selected_challenge)
-        eval_text = f"‍🏫 **Coach:**\n**⚖️ Conflict Scenario:** {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
-    else:
-        history[-1] = {"role": "assistant", "content": "‍🏫 **Coach:** Error: Invalid module selected."}
-        return history
-
-    history[-1] = {"role": "assistant", "content": eval_text}
-    # Update tracking
-    update_tracking(module, selected_challenge, transcript, feedback)
-    return history
-def skill_training_voice(module: str, audio_path, history) -> tuple:
-    history, transcript = process_voice_input_and_chat(audio_path, history)
-    if not transcript:
-        return history
-    if selected_challenge is None or selected_time_limit is None:
-        history.append({"role": "assistant", "content": "Error: Please generate a challenge first by clicking 'Get Your Challenge'."})
-        return history
-    history.append({"role": "assistant", "content": "Thinking..."})
-    if module == "Impromptu Speaking":
-        feedback = run_impromptu_speaking(transcript, selected_challenge, selected_time_limit)
-        eval_text = f"**🔹 Topic:** {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
-    elif module == "Storytelling":
-        feedback = run_storytelling(transcript, selected_challenge)
-        eval_text = f"**📖 Story Prompt:** {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
-    elif module == "Conflict Resolution":
-        feedback = run_conflict_resolution(transcript, selected_challenge)
-        eval_text = f"**⚖️ Conflict Scenario:** {feedback['challenge']}\n\n### 📌 **LLM Evaluation**\n{feedback['evaluation']}"
-    else:
-        history[-1] = {"role": "assistant", "content": "Error: Invalid module selected."}
-        return history
-    history[-1] = {"role": "assistant", "content": eval_text}
-    # Update tracking
-    update_tracking(module, selected_challenge, transcript, feedback)
-    return history
+    yield history
+    async for history in stream_skill_feedback(module, transcript, history, speech_analytics):
+        yield history
+
+@traced_request("skill_training_voice")
+async def skill_training_voice(module: str, audio_path, history, request: gr.Request):
+    history, transcript, analytics = await asyncio.to_thread(process_voice_input_and_chat, audio_path, history, request)
+    async for history in stream_skill_voice_feedback(module, transcript, history, analytics):
+        yield history
+
+# Live microphone answers: transcribed while the user speaks, so only the tail is left when they stop
+def stream_live_answer(audio_frame, transcriber, request: gr.Request):
+    if audio_frame is None:
+        return gr.update(), transcriber
+    if transcriber is None:
+        transcriber = StreamingTranscriber(profile_key=request.session_hash)
+    sample_rate, frames = audio_frame
+    return transcriber.add_frames(sample_rate, frames), transcriber
+
+@traced_request("skill_training_live")
+async def skill_training_live(module: str, transcriber, history):
+    if transcriber is None:
+        history.append({"role": "user", "content": "Error: No audio provided."})
+        yield history, None
+        return
+    history.append({"role": "user", "content": "Transcribing..."})
+    yield history, None
+    result = await asyncio.to_thread(transcriber.finish)
+    transcript = result["text"]
+    if not result["segments"]:
+        history[-1] = {"role": "user", "content": "Error: Could not transcribe audio."}
+        transcript = None
+    async for history in stream_skill_voice_feedback(module, transcript, history, result.get("analytics")):
+        yield history, None
 
 # Presentation Assessment (Text and Voice with File Upload)
-def presentation_assessment_text(text, history):
+async def stream_presentation_feedback(text: str, history):
+    """Streams the presentation assessment into the last history message."""
+    async for assessment in stream_presentation_assessment(text):
+        # Format response in Markdown
+        eval_text = f"""🏫 **Coach:**  
+### 📌 **LLM Evaluation**  
+{assessment["raw_feedback"]}
+"""
+        history[-1] = {"role": "assistant", "content": eval_text}
+        yield history
+
+@traced_request("presentation_text")
+async def presentation_assessment_text(text, history):
     if not text.strip():
-        return history
+        yield history
+        return
 
     history.append({"role": "user", "content": f"👤 **You:** {text}"})
     history.append({"role": "assistant", "content": "‍🏫 **Coach:** Thinking..."})
-
-    assessment = assess_presentation(text)
-
-    # Format response in Markdown
-    eval_text = f"""🏫 **Coach:**  
-### 📌 **LLM Evaluation**  
-{assessment["raw_feedback"]}
-"""
-    history[-1] = {"role": "assistant", "content": eval_text}
-    return history
+    yield history
+    async for history in stream_presentation_feedback(text, history):
+        yield history
 
 
 
-def presentation_assessment_voice(audio_path, history):
-    history, transcript = process_voice_input_and_chat(audio_path, history)
+@traced_request("presentation_voice")
+async def presentation_assessment_voice(audio_path, history, request: gr.Request):
+    if audio_path is None:
+        history.append({"role": "user", "content": "Error: No audio provided."})
+        yield history
+        return
+    # Rehearsals can run for half an hour: decode and transcribe them block by block, showing the transcript as it grows
+    history.append({"role": "user", "content": "Transcribing..."})
+    yield history
+    result = None
+    try:
+        with scratch_workspace("presentation") as workspace:
+            results = stream_transcription(workspace.adopt(audio_path), profile_key=request.session_hash)
+            while (partial := await asyncio.to_thread(next, results, None)) is not None:
+                result = partial
+                history[-1] = {"role": "user", "content": f"Transcribing... {result['text']}"}
+                yield history
+    except OSError:
+        result = None
+    transcript = result["text"] if result and result["segments"] else None
     if not transcript:
-        return history
+        history[-1] = {"role": "user", "content": "Error: Could not transcribe audio."}
+        yield history
+        return
 
     history[-1] = {"role": "user", "content": f"👤 **You:** {transcript}"}
     history.append({"role": "assistant", "content": "‍🏫 **Coach:** Thinking..."})
-
-    assessment = assess_presentation(transcript)
-
-    # Format response in Markdown
-    eval_text = f"""🏫 **Coach:**  
-### 📌 **LLM Evaluation**  
-{assessment["raw_feedback"]}
-"""
-    history[-1] = {"role": "assistant", "content": eval_text}
-    return history
+    yield history
+    async for history in stream_presentation_feedback(transcript, history):
+        yield history
 
 
 # Tracking Functions
-def load_tracking():
-    try:
-        with open(TRACKING_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-
 def get_overall_stats():
-    tracking_data = load_tracking()
     stats = []
-    for module, data in tracking_data.items():
+    for module, data in get_tracking_store().stats().items():
         stats.append({
             "Module": module.replace("_", " ").title(),
             "Task Count": data["task_count"],
@@ -209,9 +243,8 @@ def get_overall_stats():
     return pd.DataFrame(stats)
 
 def get_detailed_history(module):
-    tracking_data = load_tracking()
     formatted_module = module.lower().replace(" ", "_")
-    history = tracking_data.get(formatted_module, {}).get("history", [])
+    history = get_tracking_store().history(formatted_module)
     detailed_history = []
     for i, entry in enumerate(history, 1):
         detailed_history.append({
@@ -226,6 +259,8 @@ def get_detailed_history(module):
 # Gradio UI
 with gr.Blocks(title="Verbal Communication Skills Trainer (LLM-Powered)") as demo:
     gr.Markdown("# 🎤 **Verbal Communication Skills Trainer (LLM-Powered)**")
+    model_status = gr.Markdown(value=lambda: get_residency_manager().status_markdown())
+    gr.Timer(5).tick(fn=lambda: get_residency_manager().status_markdown(), outputs=model_status)
 
     # Chat with Coach
     with gr.Tab("Chat with Coach"):
@@ -257,11 +292,18 @@ with gr.Blocks(title="Verbal Communication Skills Trainer (LLM-Powered)") as dem
             with gr.Column(scale=1):
                 skill_audio_input = gr.Audio(sources=["microphone", "upload"], type="filepath", label="🎤 Speak or Upload Audio")
                 skill_voice_submit_btn = gr.Button("🚀 Submit Response via Voice")
+            with gr.Column(scale=1):
+                skill_live_audio = gr.Audio(sources=["microphone"], streaming=True, label="🎙 Answer Live (submits when you stop)")
+                skill_live_transcript = gr.Textbox(label="📝 Live Transcript", lines=4, interactive=False)
+                skill_live_state = gr.State(None)
         skill_chat_output = gr.Chatbot(label="🗣 **Skill Training Feedback**", type="messages")
 
         generate_prompt_btn.click(fn=generate_challenge, inputs=[module_dropdown], outputs=[prompt_display, countdown_timer])
         skill_submit_btn.click(fn=skill_training_text, inputs=[module_dropdown, user_response, skill_chat_output], outputs=skill_chat_output)
         skill_voice_submit_btn.click(fn=skill_training_voice, inputs=[module_dropdown, skill_audio_input, skill_chat_output], outputs=skill_chat_output)
+        skill_live_audio.start_recording(fn=lambda: ("", None), outputs=[skill_live_transcript, skill_live_state])
+        skill_live_audio.stream(fn=stream_live_answer, inputs=[skill_live_audio, skill_live_state], outputs=[skill_live_transcript, skill_live_state], stream_every=0.5)
+        skill_live_audio.stop_recording(fn=skill_training_live, inputs=[module_dropdown, skill_live_state, skill_chat_output], outputs=[skill_chat_output, skill_live_state])
 
     # Presentation Assessment (Text and Voice with File Upload)
     with gr.Tab("Presentation Assessment"):
@@ -277,7 +319,7 @@ with gr.Blocks(title="Verbal Communication Skills Trainer (LLM-Powered)") as dem
         presentation_chat_output = gr.Chatbot(label="🗣 **Presentation Feedback**", type="messages")
 
         presentation_submit_btn.click(fn=presentation_assessment_text, inputs=[presentation_text, presentation_chat_history_state], outputs=presentation_chat_output)
-        presentation_voice_submit_btn.click(fn=presentation_assessment_voice, inputs=[presentation_audio_input, presentation_chat_history_state], outputs=presentation_chat_history_state)
+        presentation_voice_submit_btn.click(fn=presentation_assessment_voice, inputs=[presentation_audio_input, presentation_chat_history_state], outputs=presentation_chat_output)
 
     # Tracking Tab
     with gr.Tab("Tracking"):
@@ -304,4 +346,10 @@ with gr.Blocks(title="Verbal Communication Skills Trainer (LLM-Powered)") as dem
         )
         history_module_dropdown.change(fn=get_detailed_history, inputs=history_module_dropdown, outputs=detailed_history)
 
+start_scheduler()
+start_residency_manager()
+start_stt_service()
+start_scratch_reaper()
+if METRICS_ENABLED:
+    start_metrics_server()
 demo.launch()
\ No newline at end of file
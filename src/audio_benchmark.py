@@ -0,0 +1,169 @@
+# audio_benchmark.py
+"""
+Compares speech-to-text backends on a recording: model load time, transcription
+time, real-time factor (transcription time / recording length, lower is faster)
+and, given a reference transcript, word error rate. With --denoise, compares the
+noise reduction paths instead: CPU seconds and peak memory per minute of audio.
+
+    python -m src.audio_benchmark test_audio.wav --reference "what was actually said"
+    python -m src.audio_benchmark talk.wav --reference talk.txt --backends faster-whisper --model small.en
+    python -m src.audio_benchmark talk.wav --denoise
+"""
+import os
+import re
+import csv
+import time
+import argparse
+import logging
+import statistics
+import tracemalloc
+from tabulate import tabulate
+from config.settings import WHISPER_MODEL
+from src.voice_interface import (
+    SAMPLE_RATE, STT_BACKENDS, load_audio, preprocess_audio, speech_windows, create_stt_backend, stt_available,
+    estimate_snr, estimate_noise_profile, spectral_gate
+)
+
+
+def _words(text: str) -> list:
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Word-level edit distance (substitutions + insertions + deletions) divided by
+    the number of reference words. Case and punctuation are ignored.
+    """
+    reference, hypothesis = _words(reference), _words(hypothesis)
+    if not reference:
+        return float(bool(hypothesis))
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def benchmark_backend(name: str, audio, windows: list, model_name: str = WHISPER_MODEL,
+                      runs: int = 3, reference: str = None) -> dict:
+    """Loads one backend, warms it up and times `runs` transcriptions of the speech windows."""
+    backend = create_stt_backend(name, model_name)
+    started = time.perf_counter()
+    backend.load()
+    load_seconds = time.perf_counter() - started
+    backend.warmup()
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        segments = [segment for start, end in windows for segment in backend.transcribe(audio[start:end])]
+        timings.append(time.perf_counter() - started)
+    transcript = " ".join(segment["text"].strip() for segment in segments)
+
+    transcribe_seconds = statistics.median(timings)
+    return {
+        "Backend": name,
+        "Model": model_name,
+        "Load (s)": round(load_seconds, 2),
+        "Transcribe (s)": round(transcribe_seconds, 2),
+        "RTF": round(transcribe_seconds / (len(audio) / SAMPLE_RATE), 3),
+        "WER (%)": round(100 * word_error_rate(reference, transcript), 1) if reference else None,
+        "Transcript": transcript,
+    }
+
+
+def benchmark_denoise(audio, runs: int = 3) -> list:
+    """
+    Times each noise reduction path on the audio: the previous whole-file
+    noisereduce call, the blockwise spectral gate (with and without a cached
+    noise profile) and the SNR check that lets clean recordings skip both.
+    Needs noisereduce for the baseline; production no longer uses it.
+    """
+    import noisereduce as nr  # Only the --denoise baseline needs it
+    profile = estimate_noise_profile(audio)
+    methods = {
+        "noisereduce (stationary, whole file)": lambda: nr.reduce_noise(y=audio, sr=SAMPLE_RATE, stationary=True),
+        "spectral gate": lambda: spectral_gate(audio, estimate_noise_profile(audio)),
+        "spectral gate, cached profile": lambda: spectral_gate(audio, profile),
+        "SNR check only (clean audio)": lambda: estimate_snr(audio),
+    }
+    minutes = len(audio) / SAMPLE_RATE / 60
+    results = []
+    for name, run in methods.items():
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        tracemalloc.start()
+        run()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append({
+            "Method": name,
+            "Seconds / audio min": round(statistics.median(timings) / minutes, 4),
+            "Peak memory (MB)": round(peak_bytes / 1e6, 1),
+        })
+    baseline = results[0]["Seconds / audio min"]
+    for row in results:
+        row["Speedup"] = round(baseline / row["Seconds / audio min"], 1) if row["Seconds / audio min"] else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the speech-to-text backends.")
+    parser.add_argument("audio", nargs="?", default="test_audio.wav", help="Recording to transcribe")
+    parser.add_argument("--reference", help="Reference transcript, or a path to a text file with it (enables WER)")
+    parser.add_argument("--backends", nargs="+", default=list(STT_BACKENDS), choices=list(STT_BACKENDS))
+    parser.add_argument("--model", default=WHISPER_MODEL, help="Model size for every backend (e.g. base, small.en)")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per backend; the median is reported")
+    parser.add_argument("--csv", help="Append the results to this CSV file")
+    parser.add_argument("--denoise", action="store_true", help="Benchmark noise reduction instead of the STT backends")
+    args = parser.parse_args()
+
+    reference = args.reference
+    if reference and os.path.isfile(reference):
+        with open(reference) as f:
+            reference = f.read()
+
+    # Same front end as production: decode, denoise, VAD windows
+    audio = load_audio(args.audio)
+    if audio is None:
+        raise SystemExit(f"Could not decode {args.audio}.")
+    if args.denoise:
+        logging.info(f"{args.audio}: {len(audio) / SAMPLE_RATE:.1f}s of audio, SNR {estimate_snr(audio):.0f} dB")
+        _report(benchmark_denoise(audio, args.runs), args.csv)
+        return
+    audio = preprocess_audio(audio)
+    windows = speech_windows(audio)
+    logging.info(f"{args.audio}: {len(audio) / SAMPLE_RATE:.1f}s of audio in {len(windows)} speech window(s)")
+
+    results = []
+    for name in args.backends:
+        if not stt_available(name):
+            logging.warning(f"Skipping {name}: not installed.")
+            continue
+        results.append(benchmark_backend(name, audio, windows, args.model, args.runs, reference))
+    if not results:
+        raise SystemExit("No STT backend is installed.")
+
+    _report(results, args.csv)
+
+
+def _report(results: list, csv_path: str = None):
+    """Prints the results as a table and optionally appends them to a CSV file."""
+    print(tabulate([{**row, "Transcript": row["Transcript"][:60]} if "Transcript" in row else row for row in results],
+                   headers="keys", tablefmt="github"))
+    if csv_path:
+        write_header = not os.path.exists(csv_path)
+        with open(csv_path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            if write_header:
+                writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,35 @@
-from src.model_manager import generate_response
+from src.model_manager import generate_response, agenerate_response_stream
 
-def get_chat_feedback(user_input: str) -> str:
-    """
-    Provides real-time conversation coaching feedback based on user input.
-    """
-    prompt = (
+
+def _build_chat_prompt(user_input: str) -> str:
+    return (
         "You are a conversation coach. Respond to the user's message with feedback "
         "on clarity, tone, and suggestions for improvement.\n\n"
         f"User Message:\n{user_input}\n\n"
         "Coach Response:"
     )
 
+
+def get_chat_feedback(user_input: str) -> str:
+    """
+    Provides real-time conversation coaching feedback based on user input.
+    """
+    prompt = _build_chat_prompt(user_input)
+
     print(f"DEBUG: Prompt being sent to Ollama:\n{prompt}")  # ✅ Debugging print statement
-    response = generate_response(prompt)
+    response = generate_response(prompt, profile="chat")
 
     print(f"DEBUG: Generated Response from Ollama:\n{response}")  # ✅ Debugging print statement
 
     return response
 
+
+async def stream_chat_feedback(user_input: str):
+    """
+    Streams conversation coaching feedback, yielding the response text so far
+    each time a new token arrives.
+    """
+    response = ""
+    async for token in agenerate_response_stream(_build_chat_prompt(user_input), profile="chat"):
+        response += token
+        yield response
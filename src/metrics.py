@@ -0,0 +1,228 @@
+# metrics.py
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config.settings import METRICS_HOST, METRICS_PORT
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing count, one series per label combination."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._series.get(key, [0])[-1]
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(float(bound))}, cumulative
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, series[-1]
+            yield f"{self.name}_sum", labels, series[-2]
+            yield f"{self.name}_count", labels, series[-1]
+
+
+class CallbackGauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+
+    def samples(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            logging.error(f"Metrics callback for {self.name} failed: {e}")
+            return
+        if value is not None:
+            yield self.name, {}, value
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name: str, help_text: str, callback) -> CallbackGauge:
+        return self._register(CallbackGauge(name, help_text, callback))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# --------------------------
+# LLM INFERENCE METRICS
+# --------------------------
+# "module" is the generation profile: chat, impromptu, storytelling, conflict or presentation
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds", "Time from sending a request to Ollama until the first token.", ["module"])
+LLM_REQUEST_DURATION = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Wall time of an Ollama generation request.", ["module"])
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "llm_tokens_per_second", "Generation speed reported by Ollama (eval_count / eval_duration).", ["module"],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 50, 100))
+LLM_PROMPT_EVAL_DURATION = REGISTRY.histogram(
+    "llm_prompt_eval_seconds", "Prompt evaluation time reported by Ollama.", ["module"])
+LLM_MODEL_LOAD_DURATION = REGISTRY.histogram(
+    "llm_model_load_seconds", "Model load time reported by Ollama.", ["module"])
+LLM_QUEUE_WAIT = REGISTRY.histogram(
+    "llm_queue_wait_seconds", "Time a request waited for an inference slot.", ["module"])
+LLM_GENERATED_TOKENS = REGISTRY.counter(
+    "llm_generated_tokens_total", "Tokens generated by Ollama.", ["module"])
+LLM_CACHE_REQUESTS = REGISTRY.counter(
+    "llm_cache_requests_total", "Response cache lookups by result (hit or miss).", ["module", "result"])
+LLM_COALESCED_REQUESTS = REGISTRY.counter(
+    "llm_coalesced_requests_total", "Cache misses served by joining an identical in-flight generation.", ["module"])
+
+
+# --------------------------
+# SPEECH-TO-TEXT METRICS
+# --------------------------
+STT_QUEUE_WAIT = REGISTRY.histogram(
+    "stt_queue_wait_seconds", "Time a transcription job waited for a free model instance.")
+STT_JOB_DURATION = REGISTRY.histogram(
+    "stt_job_duration_seconds", "Time a model instance spent transcribing one job.")
+STT_REALTIME_FACTOR = REGISTRY.histogram(
+    "stt_realtime_factor", "Transcription time divided by audio duration (lower is faster).",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5))
+STT_CACHE_REQUESTS = REGISTRY.counter(
+    "stt_cache_requests_total", "Transcript cache lookups by result (hit or miss).", ["result"])
+
+# --------------------------
+# METRICS ENDPOINT
+# --------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would otherwise flood the app log
+
+
+_server = None
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """
+    Serves the metrics in Prometheus text format at http://host:port/metrics
+    from a background thread (idempotent). Returns the server, or None if the
+    port is unavailable.
+    """
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logging.error(f"Could not start metrics endpoint on {host}:{port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return _server
@@ -1,80 +1,865 @@
 import requests
+import tiktoken
 import json
+import time
+import asyncio
+import queue
 import logging
-from config.settings import MODEL_NAME, OLLAMA_SERVER_URL
-from functools import lru_cache
-from cachetools import LRUCache, cached
-import multiprocessing
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
+import itertools
+import threading
+import contextvars
+from concurrent.futures import Future
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+from urllib3.util.retry import Retry
+from config.settings import (
+    MODEL_NAME, OLLAMA_SERVER_URL, OLLAMA_POOL_SIZE, OLLAMA_POOL_TIMEOUT, OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT, OLLAMA_MAX_RETRIES, OLLAMA_RETRY_BACKOFF, OLLAMA_KEEP_ALIVE,
+    GENERATION_PROFILES, DEFAULT_GENERATION_PROFILE, CONTEXT_WINDOW_SIZES, CONTEXT_TOKEN_MARGIN,
+    INFERENCE_CONCURRENCY, INFERENCE_QUEUE_SIZE, INFERENCE_SUBMIT_TIMEOUT,
+    RESPONSE_CACHE_MEMORY_BYTES, RESPONSE_CACHE_PATH, RESPONSE_CACHE_DISK_BYTES, RESPONSE_CACHE_TTL_SECONDS
+)
+from src.response_cache import TieredCache, make_cache_key
+from src.metrics import (
+    REGISTRY, LLM_TIME_TO_FIRST_TOKEN, LLM_REQUEST_DURATION, LLM_TOKENS_PER_SECOND, LLM_PROMPT_EVAL_DURATION,
+    LLM_MODEL_LOAD_DURATION, LLM_QUEUE_WAIT, LLM_GENERATED_TOKENS, LLM_CACHE_REQUESTS, LLM_COALESCED_REQUESTS
+)
+from src.tracing import span, record_span, request_log_handler
+# Set up logging (the request ID matches a log line to its trace file)
+logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s",
+                    handlers=[request_log_handler()])
 
-response_cache = LRUCache(maxsize=128)  # ✅ Increased cache size
+# ✅ Successful responses only; "Error: ..." results are never cached
+response_cache = TieredCache(
+    memory_bytes=RESPONSE_CACHE_MEMORY_BYTES,
+    disk_path=RESPONSE_CACHE_PATH,
+    disk_bytes=RESPONSE_CACHE_DISK_BYTES,
+    ttl=RESPONSE_CACHE_TTL_SECONDS,
+)
 
-@cached(cache=response_cache)  # ✅ First-level caching
-@lru_cache(maxsize=128)        # ✅ Second-level caching
-def generate_response(prompt: str, max_tokens: int = 512) -> str:
+# --------------------------
+# SHARED HTTP CLIENT
+# --------------------------
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class _PoolTimeoutMixin:
+    """Waits at most OLLAMA_POOL_TIMEOUT seconds for a free connection (a blocking pool otherwise waits forever)."""
+
+    def urlopen(self, method, url, *args, pool_timeout=None, **kwargs):
+        if pool_timeout is None:
+            pool_timeout = OLLAMA_POOL_TIMEOUT
+        return super().urlopen(method, url, *args, pool_timeout=pool_timeout, **kwargs)
+
+
+class _TimedHTTPConnectionPool(_PoolTimeoutMixin, HTTPConnectionPool):
+    pass
+
+
+class _TimedHTTPSConnectionPool(_PoolTimeoutMixin, HTTPSConnectionPool):
+    pass
+
+
+class _OllamaAdapter(HTTPAdapter):
     """
-    Calls the local Ollama server to generate text using the LLaMA-13B model.
+    HTTPAdapter whose blocking pool gives up after OLLAMA_POOL_TIMEOUT seconds.
+    An exhausted pool is reported as a ConnectionError, like any other failure
+    to reach Ollama, instead of freezing the calling worker.
     """
-    url = f"{OLLAMA_SERVER_URL}generate"
-    logging.info(f"Sending request to Ollama at {url}")
 
-    optimization = {
-        "quantization": "NF4"  # ✅ Uses Normalized Float 4 (4-bit quantization)
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                   "https": _TimedHTTPSConnectionPool}
+
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        except EmptyPoolError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+
+def get_session(base_url: str = OLLAMA_SERVER_URL, pool_size: int = OLLAMA_POOL_SIZE) -> requests.Session:
+    """
+    Returns the long-lived HTTP session for an Ollama backend, creating it on first use.
+    Connections are kept alive and pooled (up to `pool_size` per backend; a
+    request waits up to OLLAMA_POOL_TIMEOUT seconds for a free one), and
+    failed connection attempts (refused, reset while connecting) are retried
+    with exponential backoff. Once a request has been sent it is never retried:
+    generations are POSTs, and resending one after a read timeout or a 5xx
+    would start a duplicate generation and multiply the user's wait.
+    """
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            retry = Retry(
+                total=OLLAMA_MAX_RETRIES,
+                connect=OLLAMA_MAX_RETRIES,
+                read=0,
+                status=0,
+                backoff_factor=OLLAMA_RETRY_BACKOFF,
+                raise_on_status=False,
+            )
+            adapter = _OllamaAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[base_url] = session
+            logging.info(f"Created pooled HTTP session for {base_url} (pool size {pool_size})")
+        return session
+
+
+def close_sessions():
+    """Closes all pooled HTTP sessions (e.g. on shutdown)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts prompt tokens with tiktoken's cl100k_base encoding, a close enough
+    approximation of the LLaMA 3 tokenizer for sizing the context window.
+    Falls back to a characters-per-token estimate if the encoding can't be loaded.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logging.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 3 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def context_window_size(prompt: str, num_predict: int) -> int:
+    """
+    Context window (num_ctx) for a request: the deployment's default
+    (CONTEXT_WINDOW_SIZES[0], the size the model is warmed up with) unless the
+    prompt plus the generation budget doesn't fit, then the smallest larger size
+    that does. Every num_ctx change makes Ollama reload the model, so requests
+    never go below the default, and only go above it to avoid truncation.
+    """
+    needed = count_tokens(prompt) + num_predict + CONTEXT_TOKEN_MARGIN
+    for size in CONTEXT_WINDOW_SIZES:
+        if size >= needed:
+            return size
+    logging.warning(f"Prompt needs {needed} tokens; capping context window at {CONTEXT_WINDOW_SIZES[-1]}.")
+    return CONTEXT_WINDOW_SIZES[-1]
+
+
+def _build_payload(prompt: str, profile: str, response_format=None) -> dict:
+    """
+    Builds the /api/generate payload, with generation options from the named
+    profile. `response_format` ("json" or a JSON schema) constrains the output.
+    """
+    generation = GENERATION_PROFILES[profile]
+    options = {
+        "num_predict": generation["num_predict"],
+        "temperature": generation["temperature"],
+        "num_ctx": context_window_size(prompt, generation["num_predict"]),
     }
+    if generation.get("stop"):
+        options["stop"] = generation["stop"]
 
     payload = {
         "model": MODEL_NAME,
         "prompt": prompt,
-        "num_ctx": 2048,
-        "num_gpu": 0,
-        "temperature": 0.7,
-        "max_tokens": max_tokens,
-        "options": optimization
+        "keep_alive": OLLAMA_KEEP_ALIVE,  # Without it, every request resets Ollama's unload timer to 5m
+        "options": options
+    }
+    if response_format is not None:
+        payload["format"] = response_format
+    return payload
+
+
+def _response_cache_key(payload: dict, stop_when=None) -> str:
+    """
+    Cache key for a request: a hash of the model, its generation options, output
+    format and the prompt, plus the name of the early-stop predicate if there is one
+    (its output is a truncated generation, so it mustn't be shared with full ones).
+    """
+    parts = [payload["model"], payload["options"], payload.get("format"), payload["prompt"]]
+    if stop_when is not None:
+        parts.append(f"{stop_when.__module__}.{stop_when.__qualname__}")
+    return make_cache_key(*parts)
+
+
+def _record_timings(data: dict, module: str) -> dict:
+    """
+    Records the timings Ollama reports in the final ("done") line of a generation
+    (durations there are in nanoseconds) and returns them for the trace span.
+    """
+    eval_count = data.get("eval_count", 0)
+    eval_seconds = data.get("eval_duration", 0) / 1e9
+    prompt_eval_seconds = data.get("prompt_eval_duration", 0) / 1e9
+    load_seconds = data.get("load_duration", 0) / 1e9
+    LLM_GENERATED_TOKENS.inc(eval_count, module=module)
+    LLM_PROMPT_EVAL_DURATION.observe(prompt_eval_seconds, module=module)
+    LLM_MODEL_LOAD_DURATION.observe(load_seconds, module=module)
+    tokens_per_second = eval_count / eval_seconds if eval_seconds else 0.0
+    if eval_count:
+        LLM_TOKENS_PER_SECOND.observe(tokens_per_second, module=module)
+    logging.info(
+        f"[{module}] {eval_count} tokens at {tokens_per_second:.1f} tok/s "
+        f"(prompt eval {prompt_eval_seconds:.2f}s, load {load_seconds:.2f}s)"
+    )
+    return {
+        "eval_count": eval_count,
+        "tokens_per_second": round(tokens_per_second, 1),
+        "prompt_eval_ms": round(prompt_eval_seconds * 1000),
+        "load_ms": round(load_seconds * 1000),
     }
 
-    logging.debug(f"Payload: {json.dumps(payload, indent=2)}")
 
+def _raise_for_status(response: requests.Response):
+    """
+    Like response.raise_for_status(), but the exception message carries
+    Ollama's own error text (e.g. "model 'x' not found").
+    """
+    if response.ok:
+        return
     try:
-        response = requests.post(url, json=payload, stream=True)
-        response.raise_for_status()
+        detail = response.json().get("error")
+    except ValueError:
+        detail = None
+    message = f"{response.status_code} {response.reason}" + (f": {detail}" if detail else "")
+    raise requests.exceptions.HTTPError(message, response=response)
 
-        generated_text = []
-        for line in response.iter_lines(decode_unicode=True):
-            if not line.strip():
-                continue
-            try:
-                data = json.loads(line)
-                logging.debug(f"Received line: {data}")
+
+def _stream_ollama(payload: dict, cancel: threading.Event = None, module: str = DEFAULT_GENERATION_PROFILE):
+    """
+    Posts a generation request to Ollama and yields response tokens as the
+    NDJSON lines arrive. Setting `cancel` (or closing the generator) closes the
+    connection, which makes Ollama abort the generation. Timings are recorded
+    in the metrics, labeled with `module`.
+    Raises requests.exceptions.RequestException on transport errors and
+    requests.exceptions.HTTPError on error statuses.
+    """
+    url = f"{OLLAMA_SERVER_URL}generate"
+    logging.info(f"Sending request to Ollama at {url}")
+    logging.debug(f"Payload: {json.dumps(payload, indent=2)}")
+
+    started = time.monotonic()
+    response = get_session().post(
+        url, json=payload, stream=True, timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+    )
+
+    timings = {"module": module}
+    try:
+        with response:  # Releases (or drops, if unread) the pooled connection when done, error statuses included
+            _raise_for_status(response)
+            for line in response.iter_lines(decode_unicode=True):
+                if cancel is not None and cancel.is_set():
+                    logging.info("Generation cancelled by caller.")
+                    return
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as e:
+                    logging.error(f"JSON decoding error: {e}")
+                    continue
 
                 # ✅ Ensure we capture response properly
-                if "response" in data and data["response"]:
-                    generated_text.append(data["response"])
+                if data.get("response"):
+                    if "ttft_ms" not in timings:
+                        ttft = time.monotonic() - started
+                        LLM_TIME_TO_FIRST_TOKEN.observe(ttft, module=module)
+                        timings["ttft_ms"] = round(ttft * 1000)
+                    yield data["response"]
+                if data.get("done"):
+                    timings.update(_record_timings(data, module))
+    finally:
+        finished = time.monotonic()
+        LLM_REQUEST_DURATION.observe(finished - started, module=module)
+        record_span("llm.generate", started, finished, **timings)
 
-            except json.JSONDecodeError as e:
-                logging.error(f"JSON decoding error: {e}")
-                continue
 
+# --------------------------
+# SINGLE-FLIGHT DEDUPLICATION
+# --------------------------
+_STREAM_END = object()
+
+
+class _InFlightGeneration:
+    """
+    One in-flight generation that every concurrent caller with the same cache
+    key follows. Tokens are buffered so callers that join late replay the
+    stream from the start. The generation is cancelled only once all of its
+    followers have gone away. `future` resolves to the final text (or the
+    "Error: ..." message) when the generation finishes, for callers that
+    must not block a thread while they wait.
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self.error = None
+        self.exception = None  # Unexpected failure, re-raised to callers waiting on `future`
+        self.done = False
+        self.future = Future()
+        self.cancel = threading.Event()
+        self._followers = 1  # The caller that started it
+        self._listeners = []  # (event loop, asyncio.Queue) pairs of async followers
+        self._cond = threading.Condition()
+
+    def publish(self, token: str):
+        with self._cond:
+            self.tokens.append(token)
+            listeners = list(self._listeners)
+            self._cond.notify_all()
+        for loop, tokens in listeners:
+            self._notify(loop, tokens, token)
+
+    def publish_error(self, message: str):
+        self.error = message
+        self.publish(message)
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            listeners = list(self._listeners)
+            self._cond.notify_all()
+        for loop, tokens in listeners:
+            self._notify(loop, tokens, _STREAM_END)
+        if self.exception is not None:
+            self.future.set_exception(self.exception)
+        else:
+            self.future.set_result(self.error or "".join(self.tokens).strip())
+
+    @staticmethod
+    def _notify(loop, tokens, item):
+        try:
+            loop.call_soon_threadsafe(tokens.put_nowait, item)
+        except RuntimeError:
+            pass  # The follower's event loop has already shut down
+
+    def join(self):
+        with self._cond:
+            self._followers += 1
+
+    def leave(self):
+        with self._cond:
+            self._followers -= 1
+            abandoned = self._followers == 0 and not self.done
+        if abandoned:
+            logging.info("All callers left; cancelling the generation.")
+            self.cancel.set()
+
+    def follow(self):
+        """Yields the generation's tokens, blocking until each one arrives."""
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: len(self.tokens) > index or self.done)
+                    new_tokens = self.tokens[index:]
+                    done = self.done
+                index += len(new_tokens)
+                yield from new_tokens
+                if done and index == len(self.tokens):
+                    return
+        finally:
+            self.leave()
+
+    async def afollow(self):
+        """Async variant of follow() that waits without blocking the event loop."""
+        tokens = asyncio.Queue()
+        listener = (asyncio.get_running_loop(), tokens)
+        with self._cond:
+            for token in self.tokens:
+                tokens.put_nowait(token)
+            if self.done:
+                tokens.put_nowait(_STREAM_END)
+            else:
+                self._listeners.append(listener)
+        try:
+            while (token := await tokens.get()) is not _STREAM_END:
+                yield token
+        finally:
+            with self._cond:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+            self.leave()
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _join_in_flight(cache_key: str):
+    """
+    Returns (generation, is_leader). The leader must run the generation; everyone
+    else follows the one already in flight for the same key.
+    """
+    with _in_flight_lock:
+        generation = _in_flight.get(cache_key)
+        if generation is not None and not generation.cancel.is_set():
+            generation.join()
+            logging.info("Joining identical in-flight request.")
+            return generation, False
+        generation = _InFlightGeneration()
+        _in_flight[cache_key] = generation
+        return generation, True
+
+
+def _finish_in_flight(cache_key: str, generation: _InFlightGeneration):
+    with _in_flight_lock:
+        if _in_flight.get(cache_key) is generation:
+            del _in_flight[cache_key]
+    generation.finish()
+
+
+def _cached_response(cache_key: str, module: str):
+    """Looks a response up in the cache, counting the hit or miss for `module`."""
+    with span("llm.cache_lookup", module=module) as args:
+        cached = response_cache.get(cache_key)
+        args["hit"] = cached is not None
+    LLM_CACHE_REQUESTS.inc(module=module, result="miss" if cached is None else "hit")
+    return cached
+
+
+def _join_generation(cache_key: str, module: str):
+    generation, is_leader = _join_in_flight(cache_key)
+    if not is_leader:
+        LLM_COALESCED_REQUESTS.inc(module=module)
+    return generation, is_leader
+
+
+def _run_generation(generation: _InFlightGeneration, cache_key: str, payload: dict, stop_when=None,
+                    module: str = DEFAULT_GENERATION_PROFILE, validate=None):
+    """
+    Runs one Ollama generation, publishing its tokens to every follower.
+    If `stop_when(text_so_far)` returns True, the generation is complete: the
+    connection is closed so Ollama stops generating, and the text is kept.
+    The text is cached only if `validate(text)` (when given) returns True.
+    """
+    generated_text = []
+    text = ""
+    tokens = _stream_ollama(payload, generation.cancel, module)
+    try:
+        if generation.cancel.is_set():
+            return  # Every caller left while the job was still queued
+        for token in tokens:
+            generated_text.append(token)
+            generation.publish(token)
+            text += token
+            if stop_when is not None and stop_when(text):
+                logging.info("Completion predicate satisfied; stopping the generation early.")
+                break
+        tokens.close()  # Closes the connection right away if we stopped early
+        if generation.cancel.is_set():
+            return  # Partial output of a cancelled generation isn't cached
         # ✅ Fix: Ensure we return a meaningful response
         final_text = "".join(generated_text).strip()
         if not final_text:
-            return "Error: No meaningful response received from Ollama."
-
+            generation.publish_error("Error: No meaningful response received from Ollama.")
+            return
         logging.info("Response generated successfully.")
-        return final_text
-
+        if validate is not None and not validate(final_text):
+            logging.info("Response failed validation; not caching it.")
+            return
+        response_cache.set(cache_key, final_text)
+    except requests.exceptions.HTTPError as e:
+        logging.error(f"Ollama returned an error: {e}")
+        generation.publish_error(f"Error: Ollama returned HTTP {e}")
     except requests.exceptions.RequestException as e:
         logging.error(f"Request error: {e}")
-        return "Error: Unable to connect to Ollama. Check if the server is running."
+        generation.publish_error("Error: Unable to connect to Ollama. Check if the server is running.")
+    except Exception as e:
+        generation.exception = e
+        raise
+    finally:
+        _finish_in_flight(cache_key, generation)
+
+
+def generate_response(prompt: str, profile: str = DEFAULT_GENERATION_PROFILE, response_format=None,
+                      stop_when=None, validate=None) -> str:
+    """
+    Calls the local Ollama server to generate text using the LLaMA-13B model.
+    Successful responses are served from / stored in the response cache, and
+    identical concurrent calls share a single generation. Pass a JSON schema
+    (or "json") as `response_format` to get schema-constrained JSON text back.
+    `stop_when` is an optional completion predicate over the text so far; once
+    it holds, the generation is cancelled server-side and the text returned.
+    `validate` is an optional check of the finished text (e.g. a schema
+    validation); text that fails it is returned but not cached, so retrying
+    the same request generates again instead of replaying the failure.
+    """
+    payload = _build_payload(prompt, profile, response_format)
+    cache_key = _response_cache_key(payload, stop_when)
+    cached = _cached_response(cache_key, profile)
+    if cached is not None:
+        logging.info("Response served from cache.")
+        return cached
 
+    generation, is_leader = _join_generation(cache_key, profile)
+    if is_leader:
+        _run_generation(generation, cache_key, payload, stop_when, profile, validate)
+    final_text = "".join(generation.follow()).strip()
+    return generation.error or final_text
 
+
+# --------------------------
+# INFERENCE SCHEDULER
 # --------------------------
-# MULTIPROCESSING WRAPPER
+PRIORITY_HIGH = 0  # Interactive requests a user is waiting on
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10  # Background work (batch jobs, warm-ups)
+
+
+class InferenceScheduler:
+    """
+    Long-lived scheduler that runs Ollama requests on a fixed set of worker threads.
+
+    Jobs wait in a bounded priority queue (FIFO within a priority) and at most
+    `max_concurrency` of them are in flight at once. `submit` returns a
+    concurrent.futures.Future that callers can block on, or await through
+    asyncio.wrap_future.
+    """
+
+    def __init__(self, max_concurrency: int = INFERENCE_CONCURRENCY, max_queue_size: int = INFERENCE_QUEUE_SIZE):
+        self.max_concurrency = max_concurrency
+        self._queue = queue.PriorityQueue(maxsize=max_queue_size)
+        self._sequence = itertools.count()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def start(self):
+        """Starts the worker threads (idempotent)."""
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.max_concurrency):
+                worker = threading.Thread(target=self._worker, name=f"inference-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        logging.info(f"Inference scheduler started with {self.max_concurrency} workers.")
+
+    def submit(self, fn, *args, priority: int = PRIORITY_NORMAL, timeout: float = INFERENCE_SUBMIT_TIMEOUT,
+               module: str = None, **kwargs) -> Future:
+        """
+        Queues `fn(*args, **kwargs)` and returns a Future for its result.
+        Raises queue.Full if no queue slot frees up within `timeout` seconds.
+        The job's queue wait is recorded in the metrics under `module`, if given.
+        The job runs in a copy of the caller's context, so it joins the caller's trace.
+        """
+        self.start()
+        future = Future()
+        context = contextvars.copy_context()
+        job = (priority, next(self._sequence), time.monotonic(), future, fn, args, kwargs, module, context)
+        try:
+            self._queue.put(job, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise
+        with self._lock:
+            self._submitted += 1
+        return future
+
+    def _worker(self):
+        while True:
+            _, _, enqueued_at, future, fn, args, kwargs, module, context = self._queue.get()
+            if fn is None:  # Shutdown sentinel
+                self._queue.task_done()
+                return
+            dequeued_at = time.monotonic()
+            wait = dequeued_at - enqueued_at
+            with self._lock:
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            if module is not None:
+                LLM_QUEUE_WAIT.observe(wait, module=module)
+            context.run(record_span, "llm.queue_wait", enqueued_at, dequeued_at, module=module)
+            if not future.set_running_or_notify_cancel():
+                self._queue.task_done()
+                continue
+            with self._lock:
+                self._in_flight += 1
+            try:
+                future.set_result(context.run(fn, *args, **kwargs))
+                failed = False
+            except BaseException as e:
+                future.set_exception(e)
+                failed = True
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._completed += 1
+                    self._failed += failed
+                self._queue.task_done()
+
+    def metrics(self) -> dict:
+        """Returns a snapshot of queue depth, in-flight count and queue wait times."""
+        with self._lock:
+            started = self._completed + self._in_flight
+            return {
+                "queue_depth": self._queue.qsize(),
+                "in_flight": self._in_flight,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": self._total_wait / started if started else 0.0,
+                "max_wait_seconds": self._max_wait,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stops the workers once the jobs already queued have run."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put((float("inf"), next(self._sequence), time.monotonic(), None, None, (), {}, None, None))
+        if wait:
+            for worker in workers:
+                worker.join()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> InferenceScheduler:
+    """Returns the process-wide inference scheduler, starting it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = InferenceScheduler()
+            _scheduler.start()
+        return _scheduler
+
+
+def start_scheduler() -> InferenceScheduler:
+    """Starts the inference scheduler at app startup so no request pays for it."""
+    return get_scheduler()
+
+
+def _scheduler_metric(name: str):
+    return _scheduler.metrics()[name] if _scheduler is not None else None
+
+
+REGISTRY.gauge("llm_queue_depth", "Requests waiting for an inference slot.", lambda: _scheduler_metric("queue_depth"))
+REGISTRY.gauge("llm_in_flight_requests", "Requests currently running on the scheduler.",
+               lambda: _scheduler_metric("in_flight"))
+REGISTRY.gauge("llm_rejected_requests", "Requests rejected because the inference queue was full.",
+               lambda: _scheduler_metric("rejected"))
+REGISTRY.gauge("llm_response_cache_hit_rate", "Response cache hit rate since startup.",
+               lambda: response_cache.stats()["hit_rate"])
+REGISTRY.gauge("llm_response_cache_memory_bytes", "Bytes held by the response cache memory tier.",
+               lambda: response_cache.stats()["memory_bytes"])
+REGISTRY.gauge("llm_response_cache_evictions", "Entries evicted from the response cache (both tiers).",
+               lambda: response_cache.stats()["memory_evictions"] + response_cache.stats()["disk_evictions"])
+
+
+def generate_response_parallel(prompt: str, profile: str = DEFAULT_GENERATION_PROFILE, priority: int = PRIORITY_NORMAL,
+                               response_format=None, stop_when=None, validate=None) -> str:
+    """
+    Like generate_response, but the generation runs on the shared inference
+    scheduler; this thread waits for the result.
+    """
+    return _generation_future(prompt, profile, priority, response_format, stop_when, validate).result()
+
+
+def _generation_future(prompt: str, profile: str = DEFAULT_GENERATION_PROFILE, priority: int = PRIORITY_NORMAL,
+                       response_format=None, stop_when=None, validate=None,
+                       submit_timeout: float = INFERENCE_SUBMIT_TIMEOUT) -> Future:
+    """
+    Starts or joins the generation for a prompt and returns a Future for its
+    text. The cache lookup and the join happen on the calling thread, and only
+    the leader's generation is queued on the scheduler: a follower that took a
+    worker just to wait could leave the leader's job queued behind it forever.
+    """
+    payload = _build_payload(prompt, profile, response_format)
+    cache_key = _response_cache_key(payload, stop_when)
+    cached = _cached_response(cache_key, profile)
+    if cached is not None:
+        logging.info("Response served from cache.")
+        future = Future()
+        future.set_result(cached)
+        return future
+
+    generation, is_leader = _join_generation(cache_key, profile)
+    if is_leader:
+        _submit_generation(generation, cache_key, payload, stop_when, profile, priority, validate, submit_timeout)
+    generation.future.add_done_callback(lambda _: generation.leave())
+    return generation.future
+
+
 # --------------------------
-def generate_response_parallel(prompt: str, max_tokens: int = 512):
+# PROMPT PREFILL
+# --------------------------
+def _prefill(payload: dict):
+    try:
+        response = get_session().post(
+            f"{OLLAMA_SERVER_URL}generate", json=payload, timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+        )
+        response.raise_for_status()
+        logging.info("Prompt prefix prefilled.")
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Prompt prefill failed: {e}")
+
+
+def prefill_prompt(prefix: str, profile: str = DEFAULT_GENERATION_PROFILE):
+    """
+    Has Ollama evaluate a prompt prefix ahead of time (a one-token, low-priority
+    generation) so its prompt cache already holds the prefix when the full
+    prompt arrives. It uses the same num_ctx as the full request will (the
+    default context window), since a different size would make Ollama reload
+    the model and drop the prefilled cache.
+    Returns the scheduler Future, or None if the queue is full.
+    """
+    payload = _build_payload(prefix, profile)
+    payload["options"]["num_predict"] = 1
+    payload["stream"] = False
+    try:
+        return get_scheduler().submit(_prefill, payload, priority=PRIORITY_LOW, timeout=0)
+    except queue.Full:
+        logging.info("Inference queue is full; skipping prompt prefill.")
+        return None
+
+
+# --------------------------
+# BATCH GENERATION
+# --------------------------
+def generate_many_as_completed(prompts, max_concurrency: int = INFERENCE_CONCURRENCY, profile: str = DEFAULT_GENERATION_PROFILE,
+                               priority: int = PRIORITY_LOW):
+    """
+    Generates responses for a batch of prompts on the inference scheduler,
+    keeping at most `max_concurrency` of them queued or in flight at once.
+    Yields (index, result) pairs as they complete. A failed item's result is
+    its "Error: ..." string or the exception it raised; it never aborts the batch.
+    """
+    results = queue.Queue()
+
+    def collect(index, future):
+        try:
+            results.put((index, future.result()))
+        except Exception as e:
+            results.put((index, e))
+
+    in_flight = 0
+    for index, prompt in enumerate(prompts):
+        if in_flight >= max_concurrency:
+            yield results.get()
+            in_flight -= 1
+        # Wait for a queue slot rather than rejecting batch items
+        future = _generation_future(prompt, profile, priority, submit_timeout=None)
+        future.add_done_callback(lambda f, index=index: collect(index, f))
+        in_flight += 1
+    while in_flight:
+        yield results.get()
+        in_flight -= 1
+
+
+def generate_many(prompts, max_concurrency: int = INFERENCE_CONCURRENCY, profile: str = DEFAULT_GENERATION_PROFILE,
+                  priority: int = PRIORITY_LOW) -> list:
+    """
+    Generates responses for a batch of prompts with bounded parallelism and
+    returns them in prompt order. See generate_many_as_completed for how
+    per-item errors are reported.
+    """
+    prompts = list(prompts)
+    ordered = [None] * len(prompts)
+    for index, result in generate_many_as_completed(prompts, max_concurrency, profile, priority):
+        ordered[index] = result
+    return ordered
+
+
+# --------------------------
+# TOKEN STREAMING
+# --------------------------
+def generate_response_stream(prompt: str, profile: str = DEFAULT_GENERATION_PROFILE, priority: int = PRIORITY_HIGH,
+                             stop_when=None):
+    """
+    Yields generated tokens as Ollama produces them.
+
+    The request runs on the inference scheduler, so it counts against the same
+    concurrency limit as generate_response_parallel. Errors are yielded as a
+    single "Error: ..." token and a cached response as a single token.
+    Concurrent identical requests share one generation, which is cancelled once
+    every caller has closed its generator. See generate_response for `stop_when`.
+    """
+    payload = _build_payload(prompt, profile)
+    cache_key = _response_cache_key(payload, stop_when)
+    cached = _cached_response(cache_key, profile)
+    if cached is not None:
+        yield cached
+        return
+
+    generation, is_leader = _join_generation(cache_key, profile)
+    if is_leader:
+        _submit_generation(generation, cache_key, payload, stop_when, profile, priority)
+
+    yield from generation.follow()
+
+
+def _submit_generation(generation: _InFlightGeneration, cache_key: str, payload: dict, stop_when, module: str,
+                       priority: int, validate=None, timeout: float = INFERENCE_SUBMIT_TIMEOUT):
+    """Queues the leader's generation on the inference scheduler; a full queue is published as an error."""
+    try:
+        get_scheduler().submit(_run_generation, generation, cache_key, payload, stop_when, module, validate,
+                               priority=priority, timeout=timeout, module=module)
+    except queue.Full:
+        logging.error("Inference queue is full; rejecting request.")
+        generation.publish_error("Error: The coach is busy right now. Please try again in a moment.")
+        _finish_in_flight(cache_key, generation)
+
+
+# --------------------------
+# ASYNC GENERATION
+# --------------------------
+async def agenerate_response_stream(prompt: str, profile: str = DEFAULT_GENERATION_PROFILE, priority: int = PRIORITY_HIGH,
+                                    stop_when=None):
+    """
+    Async counterpart of generate_response_stream: yields tokens as Ollama
+    streams them without blocking the event loop.
+
+    The generation runs on the inference scheduler, so UI requests share the
+    same concurrency limit, bounded queue and priorities as everything else.
+    Concurrent identical requests share one generation. If every consuming
+    task is cancelled (e.g. the Gradio clients disconnect), the generation is
+    cancelled and its connection closed, which makes Ollama abort it. See
+    generate_response for `stop_when`.
+    """
+    payload = _build_payload(prompt, profile)
+    cache_key = _response_cache_key(payload, stop_when)
+    cached = _cached_response(cache_key, profile)
+    if cached is not None:
+        yield cached
+        return
+
+    generation, is_leader = _join_generation(cache_key, profile)
+    if is_leader:
+        try:
+            # Waiting for a queue slot blocks, so do it off the event loop
+            await asyncio.to_thread(_submit_generation, generation, cache_key, payload, stop_when, profile, priority)
+        except asyncio.CancelledError:
+            generation.leave()  # The queued job sees the cancellation and doesn't run
+            raise
+
+    async for token in generation.afollow():
+        yield token
+
+
+async def agenerate_response(prompt: str, profile: str = DEFAULT_GENERATION_PROFILE) -> str:
     """
-    Uses multiprocessing to generate responses in parallel.
+    Async counterpart of generate_response.
     """
-    with multiprocessing.Pool(processes=4) as pool:  # ✅ 4 parallel workers
-        result = pool.apply_async(generate_response, (prompt, max_tokens))
-        return result.get()
\ No newline at end of file
+    tokens = [token async for token in agenerate_response_stream(prompt, profile)]
+    return "".join(tokens).strip()
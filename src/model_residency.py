@@ -0,0 +1,137 @@
+# model_residency.py
+import time
+import logging
+import threading
+import requests
+from config.settings import (
+    MODEL_NAME, OLLAMA_SERVER_URL, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT,
+    OLLAMA_KEEP_ALIVE, RESIDENCY_POLL_SECONDS, WARMUP_PROMPT, CONTEXT_WINDOW_SIZES
+)
+from src.model_manager import get_session
+
+STATUS_LABELS = {
+    "starting": "⏳ Starting up",
+    "warming": "🔥 Loading model",
+    "ready": "✅ Model ready",
+    "evicted": "🔥 Model was unloaded, reloading",
+    "unavailable": "⚠️ Ollama unavailable",
+}
+
+
+class ModelResidencyManager:
+    """
+    Keeps the Ollama model loaded so user requests never pay the cold-load cost.
+
+    On start it preloads the model with a tiny warm-up generation pinned with
+    `keep_alive`, then polls Ollama's /api/ps and re-warms the model whenever
+    it has been evicted. `status` is exposed for the UI.
+    """
+
+    def __init__(self, model: str = MODEL_NAME, keep_alive=OLLAMA_KEEP_ALIVE,
+                 poll_seconds: float = RESIDENCY_POLL_SECONDS):
+        self.model = model
+        self.keep_alive = keep_alive
+        self.poll_seconds = poll_seconds
+        self.status = "starting"
+        self.last_load_seconds = None
+        self.last_checked = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts warming and monitoring in a background thread (idempotent)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="model-residency", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def warm_up(self) -> bool:
+        """Loads the model with a one-token generation and pins it with keep_alive."""
+        self.status = "warming"
+        logging.info(f"Warming up model {self.model} (keep_alive={self.keep_alive})")
+        payload = {
+            "model": self.model,
+            "prompt": WARMUP_PROMPT,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {"num_predict": 1, "num_ctx": CONTEXT_WINDOW_SIZES[0]},
+        }
+        started = time.monotonic()
+        try:
+            response = get_session().post(
+                f"{OLLAMA_SERVER_URL}generate", json=payload, timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Model warm-up failed: {e}")
+            self.status = "unavailable"
+            return False
+        self.last_load_seconds = time.monotonic() - started
+        self.status = "ready"
+        logging.info(f"Model {self.model} is resident (warm-up took {self.last_load_seconds:.1f}s)")
+        return True
+
+    def is_resident(self) -> bool:
+        """Asks Ollama (/api/ps) whether the model is currently loaded."""
+        response = get_session().get(f"{OLLAMA_SERVER_URL}ps", timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT))
+        response.raise_for_status()
+        self.last_checked = time.time()
+        loaded = response.json().get("models", [])
+        return any(self.model in (entry.get("name"), entry.get("model")) for entry in loaded)
+
+    def check(self):
+        """Re-warms the model if Ollama has evicted it (or was unreachable)."""
+        try:
+            resident = self.is_resident()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"Model residency check failed: {e}")
+            self.status = "unavailable"
+            return
+        if not resident:
+            logging.warning(f"Model {self.model} is not loaded; re-warming.")
+            self.status = "evicted"
+            self.warm_up()
+        elif self.status != "ready":
+            self.status = "ready"
+
+    def _run(self):
+        self.warm_up()
+        while not self._stop.wait(self.poll_seconds):
+            self.check()
+
+    def status_markdown(self) -> str:
+        """One-line readiness status for the UI."""
+        label = STATUS_LABELS.get(self.status, self.status)
+        if self.status == "ready" and self.last_load_seconds is not None:
+            return f"**{label}:** `{self.model}` (warm-up {self.last_load_seconds:.1f}s)"
+        return f"**{label}:** `{self.model}`"
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_residency_manager() -> ModelResidencyManager:
+    """Returns the process-wide residency manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelResidencyManager()
+        return _manager
+
+
+def start_residency_manager() -> ModelResidencyManager:
+    """Preloads and pins the model; call once at app startup before launching the UI."""
+    manager = get_residency_manager()
+    manager.start()
+    return manager
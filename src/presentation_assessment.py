@@ -1,15 +1,31 @@
-from src.model_manager import generate_response, generate_response_parallel
+from src.model_manager import generate_response, generate_response_parallel, agenerate_response_stream
 from config.settings import PROMPTS
 
+
+def _build_presentation_prompt(presentation_text: str) -> str:
+    return PROMPTS["presentation_assessment"] + f"\n\n📜 **User's Presentation:**\n{presentation_text}"
+
+
 def assess_presentation(presentation_text: str) -> dict:
     """
     Analyzes the given presentation text, returning structured feedback.
     Scores Structure, Delivery, and Content (1-10) with detailed critique.
     """
-    prompt = PROMPTS["presentation_assessment"] + f"\n\n📜 **User's Presentation:**\n{presentation_text}"
-    raw_feedback = generate_response_parallel(prompt)
+    prompt = _build_presentation_prompt(presentation_text)
+    raw_feedback = generate_response_parallel(prompt, profile="presentation")
 
     result = {
         "raw_feedback": raw_feedback
     }
     return result
+
+
+async def stream_presentation_assessment(presentation_text: str):
+    """
+    Streams the presentation assessment, yielding a result dict with the
+    feedback received so far each time a new token arrives.
+    """
+    raw_feedback = ""
+    async for token in agenerate_response_stream(_build_presentation_prompt(presentation_text), profile="presentation"):
+        raw_feedback += token
+        yield {"raw_feedback": raw_feedback}
@@ -0,0 +1,221 @@
+# response_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+def make_cache_key(*parts) -> str:
+    """
+    Hashes the given parts (e.g. model, options, prompt) into a short, stable cache key.
+    Parts must be JSON-serializable; dict keys are sorted so option order doesn't matter.
+    """
+    canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """
+    In-process LRU cache bounded by the total size of its values in bytes,
+    rather than by entry count, so a few huge entries can't blow the budget.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return  # Would evict everything else; not worth keeping in memory
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    Persistent cache stored in a SQLite file. Entries expire after `ttl` seconds,
+    and the least recently used ones are evicted once the stored values exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " accessed_at REAL NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, expires_at),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        expired = self._conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        self.evictions += expired.rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    @property
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class TieredCache:
+    """
+    Memory tier in front of an optional persistent SQLite tier.
+    Disk hits are promoted into memory. Hit, miss and eviction counters are
+    available from stats().
+    """
+
+    def __init__(self, memory_bytes: int, disk_path: Optional[str] = None,
+                 disk_bytes: int = 0, ttl: Optional[float] = None):
+        self.memory = MemoryCache(memory_bytes)
+        self.disk = SQLiteCache(disk_path, disk_bytes, ttl) if disk_path else None
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return value
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error as e:
+                logging.error(f"Response cache read failed: {e}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value, self.ttl)
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.ttl
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl)
+            except sqlite3.Error as e:
+                logging.error(f"Response cache write failed: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / (hits + self.misses) if hits + self.misses else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory.size_bytes,
+                "memory_evictions": self.memory.evictions,
+                "disk_evictions": self.disk.evictions if self.disk is not None else 0,
+            }
@@ -0,0 +1,232 @@
+# scratch.py
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+from config.settings import (
+    SCRATCH_USE_TMPFS, SCRATCH_TMPFS_MIN_FREE_BYTES, SCRATCH_TMPFS_MAX_FILE_BYTES, SCRATCH_MAX_BYTES,
+    SCRATCH_MAX_AGE_SECONDS, SCRATCH_REAP_SECONDS
+)
+
+TMPFS_DIR = Path("/dev/shm")
+SCRATCH_DIR_NAME = "verbal-skills-scratch"
+LEGACY_TEMP_DIR = Path(tempfile.gettempdir()) / "voice_interface"  # Where the old audio pipeline left its temp files
+
+_active = set()  # Workspaces of requests still running; never reaped
+_active_lock = threading.Lock()
+_root = None
+
+
+def _scratch_dir(base: Path) -> Path:
+    root = base / SCRATCH_DIR_NAME
+    root.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return root
+
+
+def scratch_root() -> Path:
+    """
+    The directory every workspace is created in: on tmpfs (/dev/shm) when
+    SCRATCH_USE_TMPFS is set and it has SCRATCH_TMPFS_MIN_FREE_BYTES free,
+    otherwise in the system temp directory.
+    """
+    global _root
+    if _root is None:
+        base = Path(tempfile.gettempdir())
+        if SCRATCH_USE_TMPFS and TMPFS_DIR.is_dir() and os.access(TMPFS_DIR, os.W_OK):
+            if shutil.disk_usage(TMPFS_DIR).free >= SCRATCH_TMPFS_MIN_FREE_BYTES:
+                base = TMPFS_DIR
+        _root = _scratch_dir(base)
+    return _root
+
+
+def disk_scratch_root() -> Path:
+    """Scratch directory in the system temp directory, for files too large for tmpfs."""
+    return _scratch_dir(Path(tempfile.gettempdir()))
+
+
+def scratch_roots() -> list:
+    """Every directory workspaces can be in: scratch_root() and, if different, disk_scratch_root()."""
+    return list(dict.fromkeys([scratch_root(), disk_scratch_root()]))
+
+
+class ScratchWorkspace:
+    """
+    A private directory for one request's intermediate files. The directory
+    name is unique (mkdtemp), so concurrent requests can use the same file
+    names without overwriting each other. Use it as a context manager: the
+    directory is deleted when the request finishes, whether it succeeded or not.
+    """
+
+    def __init__(self, prefix: str = "request", root: Optional[Path] = None):
+        self.path = Path(tempfile.mkdtemp(prefix=f"{prefix}-", dir=root or scratch_root()))
+        self._disk_path = None  # Created on disk for the first upload too large for tmpfs
+        with _active_lock:
+            _active.add(self.path)
+
+    def file(self, name: str) -> Path:
+        """Path for a file in this workspace (only the base name is used, so it can't escape the directory)."""
+        return self.path / Path(name).name
+
+    def adopt(self, path) -> Path:
+        """
+        Gives the request its own copy of a file it was handed (a Gradio upload
+        or microphone recording), deleted with the workspace. The original is
+        left in place, so the same upload can be submitted again. The copy is a
+        hard link where the file system allows it; files over
+        SCRATCH_TMPFS_MAX_FILE_BYTES go to a directory on disk rather than tmpfs.
+        Returns the copy's path.
+        """
+        source = Path(path)
+        directory = self.path
+        if source.stat().st_size > SCRATCH_TMPFS_MAX_FILE_BYTES:
+            directory = self._disk_directory()
+        target = directory / source.name
+        try:
+            os.link(source, target)
+        except OSError:  # Another file system (e.g. tmpfs), or links aren't supported
+            shutil.copyfile(source, target)
+        return target
+
+    def _disk_directory(self) -> Path:
+        disk_root = disk_scratch_root()
+        if self.path.parent == disk_root:
+            return self.path
+        if self._disk_path is None:
+            self._disk_path = Path(tempfile.mkdtemp(prefix=f"{self.path.name}-", dir=disk_root))
+            with _active_lock:
+                _active.add(self._disk_path)
+        return self._disk_path
+
+    def cleanup(self):
+        for path in (self.path, self._disk_path):
+            if path is not None:
+                shutil.rmtree(path, ignore_errors=True)
+                with _active_lock:
+                    _active.discard(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+
+
+def scratch_workspace(prefix: str = "request") -> ScratchWorkspace:
+    """
+    Creates a workspace for one request. If the scratch area is over
+    SCRATCH_MAX_BYTES it is reaped first; raises OSError if that doesn't free
+    enough space (every byte belongs to a running request).
+    """
+    root = scratch_root()
+    if scratch_usage(root) > SCRATCH_MAX_BYTES:
+        reap_scratch(root)
+        if scratch_usage(root) > SCRATCH_MAX_BYTES:
+            raise OSError(f"Scratch space {root} is full ({SCRATCH_MAX_BYTES} bytes).")
+    return ScratchWorkspace(prefix, root)
+
+
+def _size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass  # Deleted while we were walking
+    return total
+
+
+def scratch_usage(root: Optional[Path] = None) -> int:
+    """Bytes currently held in the scratch area."""
+    return _size(Path(root or scratch_root()))
+
+
+def reap_scratch(root: Optional[Path] = None, max_age: float = SCRATCH_MAX_AGE_SECONDS,
+                 max_bytes: int = SCRATCH_MAX_BYTES) -> int:
+    """
+    Deletes workspaces left behind by crashed or killed requests (older than
+    `max_age` seconds), then the oldest remaining ones until the scratch area
+    is under `max_bytes`. Workspaces of running requests are never touched.
+    Returns the number of entries deleted.
+    """
+    root = Path(root or scratch_root())
+    with _active_lock:
+        active = set(_active)
+    entries = []
+    for entry in root.iterdir():
+        if entry in active:
+            continue
+        try:
+            entries.append((entry.stat().st_mtime, entry, _size(entry)))
+        except OSError:
+            continue
+    entries.sort()
+
+    now = time.time()
+    total = scratch_usage(root)
+    removed = 0
+    for modified, entry, size in entries:
+        if modified >= now - max_age and total <= max_bytes:
+            break
+        if entry.is_dir():
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            entry.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    if removed:
+        logging.info(f"Reaped {removed} scratch entries from {root}; {max(total, 0)} bytes in use.")
+    return removed
+
+
+class ScratchReaper:
+    """Background thread that calls reap_scratch every `interval` seconds."""
+
+    def __init__(self, interval: float = SCRATCH_REAP_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the reaper thread (idempotent)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="scratch-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            for root in scratch_roots():
+                try:
+                    reap_scratch(root)
+                except OSError as e:
+                    logging.error(f"Scratch reaping failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+
+_reaper = None
+_reaper_lock = threading.Lock()
+
+
+def start_scratch_reaper() -> ScratchReaper:
+    """Cleans up after crashed requests now and every SCRATCH_REAP_SECONDS; call once at app startup."""
+    global _reaper
+    with _reaper_lock:
+        if _reaper is None:
+            shutil.rmtree(LEGACY_TEMP_DIR, ignore_errors=True)
+            _reaper = ScratchReaper()
+            _reaper.start()
+        return _reaper
@@ -2,38 +2,82 @@
 import re
 import random
 import json
-import os
-from config.settings import PROMPTS
-from src.model_manager import generate_response, generate_response_parallel
-
-# Path to the task tracking JSON file
-TRACKING_FILE = "config/task_tracking.json"
-
-# Initialize the tracking file if it doesn't exist
-def initialize_tracking():
-    default_tracking = {
-        "impromptu_speaking": {"task_count": 0, "attempts": 0, "average_score": 0.0, "history": []},
-        "storytelling": {"task_count": 0, "attempts": 0, "average_score": 0.0, "history": []},
-        "conflict_resolution": {"task_count": 0, "attempts": 0, "average_score": 0.0, "history": []}
-    }
-    if not os.path.exists(TRACKING_FILE):
-        os.makedirs(os.path.dirname(TRACKING_FILE), exist_ok=True)
-        with open(TRACKING_FILE, 'w') as f:
-            json.dump(default_tracking, f, indent=4)
-    return default_tracking
-
-# Load tracking data
-def load_tracking():
-    try:
-        with open(TRACKING_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return initialize_tracking()
+import asyncio
+import logging
+from config.settings import PROMPTS, EARLY_STOP_ON_SCORES, SCORING_MODE, SCORING_CRITERIA, SCORING_JSON_INSTRUCTIONS, SCORING_REPAIR_PROMPT
+from src.model_manager import generate_response, generate_response_parallel, agenerate_response_stream, prefill_prompt
+from src.tracing import traced
+from src.speech_analytics import apply_time_limit, summarize_speech
+from src.tracking_store import get_tracking_store
+
+def _compile_critique_template(module: str, template: str) -> tuple:
+    """
+    Splits a critique template into a prefix (static rubric + challenge) and a
+    suffix (user input). The rubric must come first with no placeholders and
+    {user_input} must come last, so consecutive critiques share a long, stable
+    prefix that Ollama can reuse from its prompt cache.
+    """
+    challenge_at = template.find("{challenge}")
+    user_input_at = template.find("{user_input}")
+    if challenge_at < 0 or user_input_at < challenge_at:
+        raise ValueError(f"Critique template for '{module}' must place {{challenge}} before {{user_input}}.")
+    if "{" in template[:challenge_at] or "{" in template[user_input_at + len("{user_input}"):]:
+        raise ValueError(f"Critique template for '{module}' must keep the rubric static and {{user_input}} last.")
+    return template[:user_input_at], template[user_input_at:]
 
-# Save tracking data
-def save_tracking(tracking_data):
-    with open(TRACKING_FILE, 'w') as f:
-        json.dump(tracking_data, f, indent=4)
+# Compiled once at import so layout mistakes in settings fail fast
+CRITIQUE_TEMPLATES = {
+    module: _compile_critique_template(module, config["critique_prompt"])
+    for module, config in PROMPTS.items()
+    if isinstance(config, dict) and "critique_prompt" in config
+}
+
+def _compile_delivery_rubric(module: str, config: dict):
+    """
+    Checks that a module's "measured_delivery" question is part of its rubric,
+    so a reworded rubric fails at import instead of silently keeping the
+    question that asks the model to guess pacing from plain text.
+    """
+    question, measured = config["measured_delivery"]
+    if question not in CRITIQUE_TEMPLATES[module][0] or "{delivery}" not in measured:
+        raise ValueError(f"Measured delivery for '{module}' must replace a rubric question with {{delivery}}.")
+    return question, measured
+
+DELIVERY_RUBRICS = {
+    module: _compile_delivery_rubric(module, PROMPTS[module])
+    for module in CRITIQUE_TEMPLATES
+    if "measured_delivery" in PROMPTS[module]
+}
+
+def critique_prefix(module: str, challenge: str, speech_analytics: dict = None) -> str:
+    """
+    Returns the part of the critique prompt known as soon as the challenge is picked.
+    With `speech_analytics` (a voice answer), the rubric's delivery question is
+    replaced by the measured values; the prompt cache is then reused only up to that line.
+    """
+    prefix, _ = CRITIQUE_TEMPLATES[module]
+    prefix = prefix.format(challenge=challenge)
+    if speech_analytics and module in DELIVERY_RUBRICS:
+        question, measured = DELIVERY_RUBRICS[module]
+        prefix = prefix.replace(question, measured.format(delivery=summarize_speech(speech_analytics)), 1)
+    return prefix
+
+def build_critique_prompt(module: str, challenge: str, user_input: str, speech_analytics: dict = None) -> str:
+    """
+    Builds the full critique prompt: the shared prefix followed by the user's input.
+    """
+    _, suffix = CRITIQUE_TEMPLATES[module]
+    return critique_prefix(module, challenge, speech_analytics) + suffix.format(user_input=user_input)
+
+def prefill_critique(module: str, challenge: str):
+    """
+    Starts evaluating the rubric + challenge prefix in the background while the
+    user is still answering, so only their answer is left to process on submit.
+    """
+    formatted_module = module.lower().replace(" ", "_")
+    if formatted_module not in CRITIQUE_TEMPLATES:
+        return None
+    return prefill_prompt(critique_prefix(formatted_module, challenge), profile=PROMPTS[formatted_module]["profile"])
 
 def extract_scores(evaluation: str) -> list:
     """
@@ -49,61 +93,254 @@ def extract_scores(evaluation: str) -> list:
     matches = re.findall(score_pattern, evaluation)
     return [float(match) for match in matches]
 
-def run_impromptu_speaking(user_input: str, challenge: str, time_limit: int) -> dict:
+SCORE_BREAKDOWN_HEADING = re.compile(r"score\s+breakdown", re.IGNORECASE)
+
+def _score_section(evaluation: str) -> str:
     """
-    Evaluates the user's impromptu speaking response and calculates the average score.
+    Returns the text after the last "Score Breakdown" heading, or None if there is none.
     """
-    critique_prompt = PROMPTS["impromptu_speaking"]["critique_prompt"].format(
-        challenge=challenge, user_input=user_input
-    )
-    evaluation = generate_response_parallel(critique_prompt)
-    scores = extract_scores(evaluation)
-    average_score = sum(scores) / 5 if len(scores) == 5 else 0
+    matches = list(SCORE_BREAKDOWN_HEADING.finditer(evaluation))
+    return evaluation[matches[-1].end():] if matches else None
+
+def scoring_complete(evaluation: str) -> bool:
+    """
+    Completion predicate for critique streams: true once the final score
+    breakdown holds all five criterion scores, so the trailing bonus sections
+    and sign-offs don't have to be generated.
+    """
+    section = _score_section(evaluation)
+    return section is not None and len(extract_scores(section)) >= 5
+
+def _criterion_scores(text: str, module: str) -> list:
+    """
+    Finds each of the module's criteria by name and takes the score on its
+    line (the last one, if a criterion is mentioned more than once).
+    Returns None unless all five are found.
+    """
+    scores = []
+    for label in SCORING_CRITERIA[module].values():
+        matches = re.findall(re.escape(label) + r"[^\n]*?(?<![\d.])(\d+(?:\.\d+)?)/10", text, re.IGNORECASE)
+        if not matches:
+            return None
+        scores.append(float(matches[-1]))
+    return scores
+
+def average_score_from_text(evaluation: str, module: str = None) -> float:
+    """
+    Averages the five criterion scores of the final score breakdown (or of the
+    whole evaluation if it has no breakdown heading). With `module`, scores are
+    matched to its criteria by name; otherwise the text must hold exactly five
+    scores, so stray or extra "X/10"s are never taken for criterion scores.
+    Returns 0 if the five scores can't be found.
+    """
+    section = _score_section(evaluation)
+    text = section if section is not None else evaluation
+    scores = _criterion_scores(text, module) if module else None
+    if scores is None:
+        scores = extract_scores(text)
+    return sum(scores) / 5 if len(scores) == 5 else 0
+
+def scoring_schema(module: str) -> dict:
+    """
+    JSON schema for a structured evaluation: the module's five criterion
+    scores plus the feedback sections.
+    """
+    criteria = list(SCORING_CRITERIA[module])
+    feedback_list = {"type": "array", "items": {"type": "string"}}
     return {
-        "challenge": challenge,
-        "evaluation": evaluation,
-        "average_score": average_score,
-        "success": True
+        "type": "object",
+        "properties": {
+            "scores": {
+                "type": "object",
+                "properties": {criterion: {"type": "number", "minimum": 0, "maximum": 10} for criterion in criteria},
+                "required": criteria
+            },
+            "strengths": feedback_list,
+            "improvements": feedback_list,
+            "suggestions": feedback_list,
+            "summary": {"type": "string"}
+        },
+        "required": ["scores", "strengths", "improvements", "suggestions", "summary"]
     }
 
-def run_storytelling(user_input: str, challenge: str) -> dict:
+def validate_structured_evaluation(module: str, raw: str) -> tuple:
     """
-    Evaluates the user's story and calculates the average score.
+    Parses and validates a structured evaluation.
+
+    Returns:
+        tuple: (parsed data or None, list of problems; empty if valid).
     """
-    critique_prompt = PROMPTS["storytelling"]["critique_prompt"].format(
-        challenge=challenge, user_input=user_input
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        return None, [f"The response is not valid JSON ({e.msg})."]
+    if not isinstance(data, dict):
+        return None, ["The response must be a JSON object."]
+
+    problems = []
+    scores = data.get("scores")
+    if not isinstance(scores, dict):
+        problems.append('"scores" must be an object.')
+    else:
+        for criterion in SCORING_CRITERIA[module]:
+            score = scores.get(criterion)
+            if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 10:
+                problems.append(f'"scores.{criterion}" must be a number from 0 to 10.')
+    for section in ("strengths", "improvements", "suggestions"):
+        items = data.get(section)
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            problems.append(f'"{section}" must be a list of strings.')
+    if not isinstance(data.get("summary"), str):
+        problems.append('"summary" must be a string.')
+    return data, problems
+
+def render_structured_evaluation(module: str, data: dict, scores: dict, average_score: float) -> str:
+    """
+    Formats a validated structured evaluation as Markdown for the chat panel.
+    """
+    lines = [data["summary"].strip(), "", "## 📊 **Final Score Breakdown**"]
+    for criterion, label in SCORING_CRITERIA[module].items():
+        lines.append(f"- **{label}:** {scores[criterion]:g}/10")
+    lines.append(f"- **Average Score:** {average_score:.1f}/10")
+    for title, section in (("✅ **Key Strengths**", "strengths"),
+                           ("⚠️ **Areas for Improvement**", "improvements"),
+                           ("💡 **Actionable Strategies**", "suggestions")):
+        if data[section]:
+            lines += ["", f"## {title}"] + [f"- {item}" for item in data[section]]
+    return "\n".join(lines)
+
+@traced("skill.evaluate_structured")
+def evaluate_structured(module: str, challenge: str, user_input: str, speech_analytics: dict = None) -> dict:
+    """
+    Evaluates a response with schema-constrained JSON output instead of prose.
+    If the output fails validation, asks the model once to repair it.
+    """
+    criteria = SCORING_CRITERIA[module]
+    schema = scoring_schema(module)
+    profile = PROMPTS[module]["profile"]
+    prompt = build_critique_prompt(module, challenge, user_input, speech_analytics) + SCORING_JSON_INSTRUCTIONS.format(
+        criteria=", ".join(f'"{criterion}"' for criterion in criteria)
     )
-    evaluation = generate_response_parallel(critique_prompt)
-    scores = extract_scores(evaluation)
-    average_score = sum(scores) / 5 if len(scores) == 5 else 0
+    # Only schema-valid output is cached; a cached failure would be replayed on every resubmission
+    is_valid = lambda text: not validate_structured_evaluation(module, text)[1]
+    raw = generate_response_parallel(prompt, profile=profile, response_format=schema, validate=is_valid)
+    if raw.startswith("Error:"):
+        return {"challenge": challenge, "evaluation": raw, "average_score": 0, "scores": {}}
+
+    data, problems = validate_structured_evaluation(module, raw)
+    if problems:
+        logging.warning(f"Structured evaluation failed validation, requesting a repair: {problems}")
+        repair_prompt = SCORING_REPAIR_PROMPT.format(problems="\n".join(f"- {p}" for p in problems), response=raw)
+        raw = generate_response_parallel(repair_prompt, profile=profile, response_format=schema, validate=is_valid)
+        data, problems = validate_structured_evaluation(module, raw)
+    if problems:
+        logging.error(f"Structured evaluation is still invalid after repair: {problems}")
+        return {
+            "challenge": challenge,
+            "evaluation": "Error: The evaluation could not be scored. Please submit your response again.",
+            "average_score": 0,
+            "scores": {}
+        }
+
+    scores = {criterion: float(data["scores"][criterion]) for criterion in criteria}
+    average_score = sum(scores.values()) / len(scores)
     return {
         "challenge": challenge,
-        "evaluation": evaluation,
-        "average_score": average_score
+        "evaluation": render_structured_evaluation(module, data, scores, average_score),
+        "average_score": average_score,
+        "scores": scores
     }
 
-def run_conflict_resolution(user_input: str, challenge: str) -> dict:
+@traced("skill.evaluate")
+def _evaluate(module: str, challenge: str, user_input: str, speech_analytics: dict = None) -> dict:
+    """
+    Runs the critique for a module in the configured SCORING_MODE.
+    """
+    if SCORING_MODE == "json":
+        result = evaluate_structured(module, challenge, user_input, speech_analytics)
+    else:
+        critique_prompt = build_critique_prompt(module, challenge, user_input, speech_analytics)
+        stop_when = scoring_complete if EARLY_STOP_ON_SCORES else None
+        evaluation = generate_response_parallel(critique_prompt, profile=PROMPTS[module]["profile"], stop_when=stop_when)
+        average_score = average_score_from_text(evaluation, module)
+        result = {
+            "challenge": challenge,
+            "evaluation": evaluation,
+            "average_score": average_score
+        }
+    if speech_analytics:
+        result["speech_analytics"] = speech_analytics
+    return result
+
+def run_impromptu_speaking(user_input: str, challenge: str, time_limit: int, speech_analytics: dict = None) -> dict:
+    """
+    Evaluates the user's impromptu speaking response and calculates the average score.
+    `speech_analytics` (from a voice answer's transcription) are checked against the time limit and attached.
+    """
+    if speech_analytics:
+        speech_analytics = apply_time_limit(speech_analytics, time_limit)
+    result = _evaluate("impromptu_speaking", challenge, user_input, speech_analytics)
+    result["success"] = True
+    return result
+
+def run_storytelling(user_input: str, challenge: str, time_limit: int = None, speech_analytics: dict = None) -> dict:
+    """
+    Evaluates the user's story and calculates the average score.
+    """
+    if speech_analytics:
+        speech_analytics = apply_time_limit(speech_analytics, time_limit)
+    return _evaluate("storytelling", challenge, user_input, speech_analytics)
+
+def run_conflict_resolution(user_input: str, challenge: str, time_limit: int = None, speech_analytics: dict = None) -> dict:
     """
     Evaluates the user's conflict resolution response and calculates the average score.
     """
-    critique_prompt = PROMPTS["conflict_resolution"]["critique_prompt"].format(
-        challenge=challenge, user_input=user_input
-    )
-    evaluation = generate_response_parallel(critique_prompt)
-    scores = extract_scores(evaluation)
-    average_score = sum(scores) / 5 if len(scores) == 5 else 0
-    return {
+    if speech_analytics:
+        speech_analytics = apply_time_limit(speech_analytics, time_limit)
+    return _evaluate("conflict_resolution", challenge, user_input, speech_analytics)
+
+async def stream_skill_evaluation(module: str, user_input: str, challenge: str,
+                                  speech_analytics: dict = None, time_limit: int = None):
+    """
+    Streams the critique for a skill module, yielding a result dict with the
+    evaluation so far each time a new token arrives. The final dict also
+    carries the 'average_score', and the 'speech_analytics' of a voice answer.
+    """
+    formatted_module = module.lower().replace(" ", "_")
+    if speech_analytics:
+        speech_analytics = apply_time_limit(speech_analytics, time_limit)
+    if SCORING_MODE == "json":
+        # Partial JSON isn't worth showing; deliver the rendered evaluation in one piece
+        result = await asyncio.to_thread(evaluate_structured, formatted_module, challenge, user_input, speech_analytics)
+        if speech_analytics:
+            result["speech_analytics"] = speech_analytics
+        yield result
+        return
+
+    critique_prompt = build_critique_prompt(formatted_module, challenge, user_input, speech_analytics)
+    evaluation = ""
+    stop_when = scoring_complete if EARLY_STOP_ON_SCORES else None
+    async for token in agenerate_response_stream(critique_prompt, profile=PROMPTS[formatted_module]["profile"],
+                                                 stop_when=stop_when):
+        evaluation += token
+        yield {"challenge": challenge, "evaluation": evaluation}
+
+    evaluation = evaluation.strip()
+    average_score = average_score_from_text(evaluation, formatted_module)
+    result = {
         "challenge": challenge,
         "evaluation": evaluation,
         "average_score": average_score
     }
+    if speech_analytics:
+        result["speech_analytics"] = speech_analytics
+    yield result
 
 def get_random_training_prompt(module: str) -> dict:
     """
     Generates a random challenge for the specified module and updates task count.
     """
     formatted_module = module.lower().replace(" ", "_")
-    tracking_data = load_tracking()
 
     if formatted_module not in PROMPTS or not PROMPTS[formatted_module]["topics"]:
         return {
@@ -117,8 +354,7 @@ def get_random_training_prompt(module: str) -> dict:
     instructions = PROMPTS[formatted_module]["instructions"].format(time_limit=time_limit)
 
     # Update task count
-    tracking_data[formatted_module]["task_count"] += 1
-    save_tracking(tracking_data)
+    get_tracking_store().increment_task_count(formatted_module)
 
     return {
         "challenge": challenge,
@@ -126,30 +362,15 @@ def get_random_training_prompt(module: str) -> dict:
         "instructions": instructions
     }
 
+@traced("tracking.update")
 def update_tracking(module: str, challenge: str, user_input: str, feedback: dict):
     """
     Updates the tracking data after a challenge attempt.
     """
     formatted_module = module.lower().replace(" ", "_")
-    tracking_data = load_tracking()
-
-    # Update attempts
-    tracking_data[formatted_module]["attempts"] += 1
-
-    # Update average score
-    average_score = feedback.get("average_score", 0.0)
-    current_attempts = tracking_data[formatted_module]["attempts"]
-    current_avg = tracking_data[formatted_module]["average_score"]
-    tracking_data[formatted_module]["average_score"] = (
-        (current_avg * (current_attempts - 1) + average_score) / current_attempts
+    get_tracking_store().record_attempt(
+        formatted_module, challenge, user_input, feedback["evaluation"],
+        average_score=feedback.get("average_score", 0.0),
+        scores=feedback.get("scores", {}),
+        speech_analytics=feedback.get("speech_analytics"),
     )
-
-    # Update history
-    tracking_data[formatted_module]["history"].append({
-        "challenge": challenge,
-        "user_input": user_input,
-        "evaluation": feedback["evaluation"],
-        "average_score": average_score
-    })
-
-    save_tracking(tracking_data)
\ No newline at end of file
@@ -0,0 +1,111 @@
+# speech_analytics.py
+"""
+Delivery metrics for a spoken answer, measured from the transcript's segment
+timestamps and (when the audio is available) its voiced-frame envelope:
+speaking rate, pauses, filler words and talk time against the challenge's
+time limit. Deterministic and cheap, so the coach gets measurements instead of
+guessing pacing and fluency from plain text.
+"""
+import re
+from typing import Optional
+import numpy as np
+
+MIN_PAUSE_SECONDS = 0.25  # Shorter gaps are part of normal articulation
+LONG_PAUSE_SECONDS = 2.0  # Pauses this long read as hesitation rather than emphasis
+PAUSE_BUCKETS = (MIN_PAUSE_SECONDS, 0.5, 1.0, LONG_PAUSE_SECONDS, np.inf)
+
+# Whisper tends to drop "um"/"uh", so with it the filler rate is a lower bound
+FILLER_WORDS = ("um", "umm", "uh", "uhm", "er", "erm", "ah", "hmm", "mm", "basically", "literally")
+FILLER_PHRASES = ("you know", "i mean", "kind of", "sort of")
+
+
+def _words(text: str) -> np.ndarray:
+    return np.array(re.findall(r"[a-z0-9']+", text.lower()), dtype=str)
+
+
+def filler_counts(text: str) -> dict:
+    """Occurrences of each filler word or phrase in the text (only those that occur)."""
+    words = _words(text)
+    if not len(words):
+        return {}
+    bigrams = np.char.add(np.char.add(words[:-1], " "), words[1:])
+    found = np.concatenate([words[np.isin(words, FILLER_WORDS)], bigrams[np.isin(bigrams, FILLER_PHRASES)]])
+    fillers, counts = np.unique(found, return_counts=True)
+    return {str(filler): int(count) for filler, count in zip(fillers, counts)}
+
+
+def _speech_runs(segments: list, voiced: Optional[np.ndarray], frame_seconds: float) -> np.ndarray:
+    """(start, end) seconds of each stretch of speech, from the voiced envelope if given, else the segments."""
+    if voiced is not None and voiced.any():
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+        return edges.reshape(-1, 2) * frame_seconds
+    return np.array([[segment["start"], segment["end"]] for segment in segments], dtype=float).reshape(-1, 2)
+
+
+def analyze_speech(text: str, segments: list, voiced: Optional[np.ndarray] = None,
+                   frame_seconds: float = 0.03, time_limit_seconds: Optional[float] = None) -> dict:
+    """
+    Measures the delivery of a transcribed answer.
+
+    `segments` are the transcript's [{"start", "end", "text"}] in seconds;
+    `voiced` is an optional per-frame speech mask of the audio (frames of
+    `frame_seconds`), which finds pauses inside segments too. Talk time runs
+    from the first word to the last, so leading and trailing silence don't count.
+    """
+    word_count = len(_words(text))
+    fillers = filler_counts(text)
+    filler_count = sum(fillers.values())
+    runs = _speech_runs(segments, voiced, frame_seconds)
+    if len(runs):
+        talk_time = float(runs[-1, 1] - runs[0, 0])
+        gaps = runs[1:, 0] - runs[:-1, 1]
+        pauses = gaps[gaps >= MIN_PAUSE_SECONDS]
+        speaking_time = talk_time - float(pauses.sum())
+    else:
+        talk_time = speaking_time = 0.0
+        pauses = np.empty(0)
+
+    analytics = {
+        "word_count": word_count,
+        "talk_time_seconds": round(talk_time, 1),
+        "speaking_time_seconds": round(speaking_time, 1),
+        "words_per_minute": round(60 * word_count / talk_time, 1) if talk_time else None,
+        "articulation_rate_wpm": round(60 * word_count / speaking_time, 1) if speaking_time else None,
+        "pause_count": int(len(pauses)),
+        "long_pause_count": int(np.sum(pauses >= LONG_PAUSE_SECONDS)),
+        "pause_time_seconds": round(float(pauses.sum()), 1),
+        "mean_pause_seconds": round(float(pauses.mean()), 2) if len(pauses) else 0.0,
+        "longest_pause_seconds": round(float(pauses.max()), 2) if len(pauses) else 0.0,
+        "pause_histogram": {
+            f"{low:g}-{high:g}s" if np.isfinite(high) else f"{low:g}s+": int(count)
+            for low, high, count in zip(PAUSE_BUCKETS, PAUSE_BUCKETS[1:], np.histogram(pauses, PAUSE_BUCKETS)[0])
+        },
+        "filler_count": filler_count,
+        "fillers_per_100_words": round(100 * filler_count / word_count, 1) if word_count else 0.0,
+        "fillers": fillers,
+    }
+    return apply_time_limit(analytics, time_limit_seconds)
+
+
+def apply_time_limit(analytics: dict, time_limit_seconds: Optional[float]) -> dict:
+    """Adds how much of the challenge's time limit the answer used (a copy; the input is left as is)."""
+    if not time_limit_seconds:
+        return analytics
+    talk_time = analytics["talk_time_seconds"]
+    return {
+        **analytics,
+        "time_limit_seconds": time_limit_seconds,
+        "time_used_percent": round(100 * talk_time / time_limit_seconds),
+        "over_time_seconds": round(max(talk_time - time_limit_seconds, 0.0), 1),
+    }
+
+
+def summarize_speech(analytics: dict) -> str:
+    """One line of the key measurements, e.g. for the critique prompt."""
+    parts = [f"{analytics['words_per_minute']:g} words per minute" if analytics["words_per_minute"] else None,
+             f"{analytics['talk_time_seconds']:g}s talk time"
+             + (f" of a {analytics['time_limit_seconds']:g}s limit" if analytics.get("time_limit_seconds") else ""),
+             f"{analytics['pause_count']} pauses ({analytics['long_pause_count']} over {LONG_PAUSE_SECONDS:g}s, "
+             f"longest {analytics['longest_pause_seconds']:g}s)",
+             f"{analytics['fillers_per_100_words']:g} filler words per 100 words"]
+    return "; ".join(part for part in parts if part)
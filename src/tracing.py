@@ -0,0 +1,184 @@
+# tracing.py
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+from config.settings import TRACING_ENABLED, TRACE_SAMPLE_RATE, TRACE_SLOW_SECONDS, TRACE_DIR, TRACE_MAX_FILES
+
+
+class Trace:
+    """
+    Spans recorded for one user request, identified by `request_id`.
+    Written out as a Chrome trace-event file (open it in chrome://tracing or
+    https://ui.perfetto.dev) if the request was sampled or turned out slow.
+    """
+
+    def __init__(self, name: str, sampled: bool, **args):
+        self.name = name
+        self.request_id = uuid.uuid4().hex[:12]
+        self.sampled = sampled
+        self.args = args
+        self.started = time.monotonic()
+        self.events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, end: float, args: dict):
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": round(start * 1e6),
+            "dur": round((end - start) * 1e6),
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+            self._threads.setdefault(thread.ident, thread.name)
+
+    def to_chrome_trace(self) -> dict:
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        return {
+            "traceEvents": metadata + sorted(events, key=lambda event: event["ts"]),
+            "displayTimeUnit": "ms",
+            "otherData": {"request_id": self.request_id, "name": self.name, **self.args},
+        }
+
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+class RequestIdFilter(logging.Filter):
+    """Sets `request_id` on every log record: the current request's trace ID, or "-" outside a request."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id() or "-"
+        return True
+
+
+def request_log_handler(stream=None) -> logging.Handler:
+    """
+    A stream handler whose records carry the request ID, so a log format can
+    include %(request_id)s and log lines can be matched to their trace file.
+    """
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(RequestIdFilter())
+    return handler
+
+
+def record_span(name: str, start: float, end: float, **args):
+    """Records a span measured elsewhere (time.monotonic() timestamps) on the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start, end, args)
+
+
+@contextmanager
+def span(name: str, **args):
+    """
+    Times the enclosed block as a span of the current request's trace. Yields
+    the span's args dict, so the block can attach results (e.g. token counts).
+    A no-op outside a trace.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield args
+        return
+    start = time.monotonic()
+    try:
+        yield args
+    finally:
+        trace.add_span(name, start, time.monotonic(), args)
+
+
+def traced(name: str = None):
+    """Decorator that records each call of a function as a span."""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def start_trace(name: str, **args):
+    """
+    Starts the trace of one user request. The trace follows the request through
+    contextvars: into asyncio tasks, asyncio.to_thread calls and jobs submitted
+    to the inference scheduler. On exit the trace is written to TRACE_DIR if it
+    was sampled (TRACE_SAMPLE_RATE) or took longer than TRACE_SLOW_SECONDS.
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(name, sampled=random.random() < TRACE_SAMPLE_RATE, **args)
+    previous = _current_trace.get()
+    # set() rather than reset(token): async generator handlers may finish in another context
+    _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.set(previous)
+        end = time.monotonic()
+        trace.add_span(name, trace.started, end, {"request_id": trace.request_id, **args})
+        if trace.sampled or end - trace.started >= TRACE_SLOW_SECONDS:
+            write_trace(trace)
+
+
+def traced_request(name: str):
+    """Decorator that runs each call of an async generator handler (e.g. a Gradio event) in a new trace."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with start_trace(name):
+                async for item in fn(*args, **kwargs):
+                    yield item
+        return wrapper
+    return decorator
+
+
+def write_trace(trace: Trace, directory: str = TRACE_DIR) -> Optional[Path]:
+    """Writes the trace as Chrome trace-event JSON, pruning the oldest files beyond TRACE_MAX_FILES."""
+    directory = Path(directory)
+    path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}_{trace.name}_{trace.request_id}.json"
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(trace.to_chrome_trace(), f)
+        for old in sorted(directory.glob("*.json"), key=os.path.getmtime)[:-TRACE_MAX_FILES]:
+            old.unlink(missing_ok=True)
+    except OSError as e:
+        logging.error(f"Could not write trace {trace.request_id}: {e}")
+        return None
+    logging.info(f"Trace {trace.request_id} ({trace.name}, {time.monotonic() - trace.started:.2f}s) written to {path}")
+    return path
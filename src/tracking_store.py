@@ -0,0 +1,169 @@
+# tracking_store.py
+"""
+Progress tracking (per-module task counts, attempts, running average score and
+the history of evaluated attempts) stored in SQLite in WAL mode. Counter
+updates are single transactional UPDATEs and each attempt is one INSERT, so an
+update costs the same however long the history is, and concurrent Gradio
+workers (threads or processes) can't lose each other's updates.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+from config.settings import TRACKING_DB_PATH, TRACKING_JSON_PATH
+
+TRACKED_MODULES = ("impromptu_speaking", "storytelling", "conflict_resolution")
+SCHEMA_VERSION = 1  # PRAGMA user_version once the schema exists and the JSON file has been migrated
+BUSY_TIMEOUT_MS = 10000  # How long a write waits for another process's transaction
+
+
+class TrackingStore:
+    """
+    SQLite-backed tracking store. One connection is shared by the threads of
+    this process (serialized by a lock); other processes coordinate through
+    SQLite's own locking. On first use, the legacy JSON file at `json_path`
+    (if any) is imported once; the file itself is left in place as a backup.
+    """
+
+    def __init__(self, path: str = TRACKING_DB_PATH, json_path: Optional[str] = TRACKING_JSON_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                     timeout=BUSY_TIMEOUT_MS / 1000)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._initialize(json_path)
+
+    def _initialize(self, json_path: Optional[str]):
+        with self._lock, self._transaction():
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return  # Another process (or an earlier run) already set the store up
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS modules ("
+                " module TEXT PRIMARY KEY, task_count INTEGER NOT NULL DEFAULT 0,"
+                " attempts INTEGER NOT NULL DEFAULT 0, average_score REAL NOT NULL DEFAULT 0.0)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, module TEXT NOT NULL, challenge TEXT, user_input TEXT,"
+                " evaluation TEXT, average_score REAL NOT NULL, scores TEXT, speech_analytics TEXT, created_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS history_module ON history (module, id)")
+            self._conn.executemany("INSERT OR IGNORE INTO modules (module) VALUES (?)",
+                                   [(module,) for module in TRACKED_MODULES])
+            if json_path and os.path.exists(json_path):
+                self._migrate_json(json_path)
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error); takes the write lock up front so reads can't go stale."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _migrate_json(self, json_path: str):
+        """Imports the legacy task_tracking.json (runs inside the setup transaction)."""
+        try:
+            with open(json_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not migrate tracking data from {json_path}: {e}")
+            return
+        entries = 0
+        for module, stats in data.items():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO modules (module, task_count, attempts, average_score) VALUES (?, ?, ?, ?)",
+                (module, stats.get("task_count", 0), stats.get("attempts", 0), stats.get("average_score", 0.0)),
+            )
+            history = stats.get("history", [])
+            self._conn.executemany(
+                "INSERT INTO history (module, challenge, user_input, evaluation, average_score, scores, speech_analytics)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(module, entry.get("challenge"), entry.get("user_input"), entry.get("evaluation"),
+                  entry.get("average_score", 0.0), json.dumps(entry.get("scores", {})),
+                  json.dumps(entry["speech_analytics"]) if entry.get("speech_analytics") else None)
+                 for entry in history],
+            )
+            entries += len(history)
+        logging.info(f"Migrated {entries} tracking entries from {json_path} to {self.path}; "
+                     f"the JSON file is no longer used.")
+
+    def increment_task_count(self, module: str):
+        """Counts a challenge handed out for the module."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO modules (module, task_count) VALUES (?, 1)"
+                " ON CONFLICT (module) DO UPDATE SET task_count = task_count + 1",
+                (module,),
+            )
+
+    def record_attempt(self, module: str, challenge: str, user_input: str, evaluation: str,
+                       average_score: float, scores: Optional[dict] = None,
+                       speech_analytics: Optional[dict] = None):
+        """Appends an evaluated attempt and folds its score into the module's running average, atomically."""
+        with self._lock, self._transaction():
+            # SET expressions see the row's old values, so this is the incremental mean
+            self._conn.execute(
+                "INSERT INTO modules (module, attempts, average_score) VALUES (?, 1, ?)"
+                " ON CONFLICT (module) DO UPDATE SET attempts = attempts + 1,"
+                " average_score = average_score + (excluded.average_score - average_score) / (attempts + 1)",
+                (module, average_score),
+            )
+            self._conn.execute(
+                "INSERT INTO history (module, challenge, user_input, evaluation, average_score, scores,"
+                " speech_analytics, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (module, challenge, user_input, evaluation, average_score, json.dumps(scores or {}),
+                 json.dumps(speech_analytics) if speech_analytics else None, time.time()),
+            )
+
+    def stats(self) -> dict:
+        """{module: {"task_count", "attempts", "average_score"}} for every module."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT module, task_count, attempts, average_score FROM modules ORDER BY rowid").fetchall()
+        return {module: {"task_count": task_count, "attempts": attempts, "average_score": average_score}
+                for module, task_count, attempts, average_score in rows}
+
+    def history(self, module: str) -> list:
+        """The module's attempts, oldest first, in the same shape as the old JSON history entries."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT challenge, user_input, evaluation, average_score, scores, speech_analytics"
+                " FROM history WHERE module = ? ORDER BY id", (module,)).fetchall()
+        return [{
+            "challenge": challenge,
+            "user_input": user_input,
+            "evaluation": evaluation,
+            "average_score": average_score,
+            "scores": json.loads(scores) if scores else {},
+            "speech_analytics": json.loads(speech_analytics) if speech_analytics else None,
+        } for challenge, user_input, evaluation, average_score, scores, speech_analytics in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_tracking_store() -> TrackingStore:
+    """The process-wide tracking store, created (and the legacy JSON migrated) on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TrackingStore()
+        return _store
@@ -1,14 +1,30 @@
 # voice_interface.py
-import os
-import tempfile
+import json
+import hashlib
+import time
+import queue
+import threading
+from collections import OrderedDict
 import subprocess
+import contextvars
 import logging
+from math import gcd
+from concurrent.futures import Future, wait
 from pathlib import Path
 import numpy as np
-from typing import Optional, Union
+from typing import Iterable, Iterator, Optional, Union
 import soundfile as sf
-from pydub import AudioSegment
-import noisereduce as nr
+from scipy.ndimage import uniform_filter
+from scipy.signal import resample_poly
+from config.settings import (
+    WHISPER_MODEL, STT_BACKEND, FASTER_WHISPER_DEVICE, FASTER_WHISPER_COMPUTE_TYPE, STT_CPU_THREADS,
+    STT_WORKERS, STT_QUEUE_SIZE, STT_SUBMIT_TIMEOUT, STT_WARMUP_SECONDS,
+    TRANSCRIPT_CACHE_MEMORY_BYTES, TRANSCRIPT_CACHE_PATH, TRANSCRIPT_CACHE_DISK_BYTES, TRANSCRIPT_CACHE_TTL_SECONDS
+)
+from src.response_cache import TieredCache, make_cache_key
+from src.speech_analytics import analyze_speech
+from src.tracing import span, traced, record_span
+from src.metrics import REGISTRY, STT_QUEUE_WAIT, STT_JOB_DURATION, STT_REALTIME_FACTOR, STT_CACHE_REQUESTS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -23,20 +39,63 @@ except ImportError:
     logger.warning("Whisper not installed. Using fallback transcription.")
     WHISPER_AVAILABLE = False
 
+# Optional int8 CPU engine
+try:
+    from faster_whisper import WhisperModel
+
+    FASTER_WHISPER_AVAILABLE = True
+except ImportError:
+    FASTER_WHISPER_AVAILABLE = False
+
 # Constants
-DEFAULT_WHISPER_MODEL = "base"  # Smaller model for faster loading
-TEMP_DIR = Path(tempfile.gettempdir()) / "voice_interface"
-os.makedirs(TEMP_DIR, exist_ok=True)
-CHUNK_DURATION_MS = 5000  # Process audio in 5-second chunks to reduce latency
+SAMPLE_RATE = 16000  # Whisper expects 16 kHz mono float32 audio
+STT_WINDOW_SECONDS = 30  # Whisper pads every input to 30 s, so pack speech into windows up to that long
+
+# Voice activity detection (frame energy + zero-crossing rate)
+VAD_FRAME_MS = 30
+VAD_ENERGY_MARGIN_DB = 12  # Speech must be this much louder than the noise floor
+VAD_MIN_ENERGY_DB = -45  # Frames quieter than this (in dBFS) are never speech
+VAD_ZCR_THRESHOLD = 0.25  # Quieter frames with many zero crossings are unvoiced consonants (s, f, th)
+VAD_MIN_SILENCE_MS = 300  # Shorter pauses don't end a speech region
+VAD_MIN_SPEECH_MS = 150  # Shorter blips (clicks, bumps) are dropped
+VAD_PADDING_MS = 200  # Kept around each region so word onsets and endings aren't clipped
+
+# Noise reduction (STFT spectral gating against a per-session noise profile)
+DENOISE_SKIP_SNR_DB = 30  # Recordings with a speech-to-noise ratio above this are left as they are
+DENOISE_PROFILE_MIN_SNR_DB = 10  # Below this the quietest frames aren't clean background, so a cached profile is preferred
+DENOISE_NOISE_PERCENTILE = 20  # The quietest frames (by energy) the noise profile is estimated from
+DENOISE_N_FFT = 512  # 32 ms at 16 kHz
+DENOISE_HOP = DENOISE_N_FFT // 4
+DENOISE_THRESHOLD_STD = 1.5  # Bins within this many standard deviations of the noise level are gated
+DENOISE_SMOOTH_FRAMES = 5  # Mask smoothing in time (frames) and frequency (bins) to avoid musical noise
+DENOISE_SMOOTH_BINS = 3
+DENOISE_BLOCK_SECONDS = 30  # Audio is gated in blocks of this length, bounding the STFT's memory
+NOISE_PROFILE_CACHE_SIZE = 256  # Sessions (microphones) whose noise profile is remembered
 
-# Initialize model to None
-_stt_model = None
+# Streaming (live microphone) transcription
+STREAM_PAUSE_MS = 600  # Speech followed by a pause this long won't grow any further and can be committed
+STREAM_COMMIT_SECONDS = 10  # Commit finished speech to STT once this much has accumulated
+STREAM_BUFFER_SECONDS = STT_WINDOW_SECONDS + 10  # Uncommitted audio held; speech with no pause is cut before this fills
 
+# Long recordings (decoded and transcribed block by block, see stream_transcription)
+LONG_AUDIO_BLOCK_SECONDS = 10  # Decoded audio is read this much at a time
 
-def ensure_valid_audio(audio_file_path: Union[str, Path]) -> Optional[Path]:
+
+def _is_whisper_ready(path: Path) -> bool:
+    """True if the file is already 16 kHz mono PCM, so it can be read without ffmpeg."""
+    try:
+        info = sf.info(str(path))
+    except Exception:
+        return False
+    return info.samplerate == SAMPLE_RATE and info.channels == 1 and info.subtype.startswith("PCM")
+
+
+@traced("audio.decode")
+def load_audio(audio_file_path: Union[str, Path]) -> Optional[np.ndarray]:
     """
-    Ensures the audio file is valid and in the correct format for processing.
-    Converts to WAV format if necessary.
+    Decodes an audio file once into a 16 kHz mono float32 array, the format Whisper
+    takes directly. Files that are already 16 kHz mono PCM are read as is; anything
+    else is decoded by ffmpeg straight into memory through a pipe (no temp files).
     """
     audio_file_path = Path(audio_file_path)
     if not audio_file_path.exists():
@@ -45,152 +104,994 @@ def ensure_valid_audio(audio_file_path: Union[str, Path]) -> Optional[Path]:
     if audio_file_path.stat().st_size == 0:
         logger.error(f"Audio file is empty: {audio_file_path}")
         return None
-    output_path = TEMP_DIR / f"{audio_file_path.stem}_converted.wav"
+    if _is_whisper_ready(audio_file_path):
+        audio, _ = sf.read(str(audio_file_path), dtype="float32")
+        logger.info(f"Read 16 kHz mono audio directly: {audio_file_path}")
+        return audio
     try:
-        cmd = ["ffmpeg", "-y", "-i", str(audio_file_path), "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le",
-               str(output_path)]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", str(audio_file_path),
+               "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         if result.returncode != 0:
-            logger.error(f"FFmpeg conversion failed: {result.stderr}")
+            logger.error(f"FFmpeg decoding failed: {result.stderr.decode(errors='replace')}")
             return None
-        logger.info(f"Successfully converted audio to: {output_path}")
-        return output_path
+        logger.info(f"Decoded audio with FFmpeg: {audio_file_path}")
+        return np.frombuffer(result.stdout, dtype=np.float32)
     except FileNotFoundError:
         logger.error("FFmpeg is not installed or not found in PATH. Please install FFmpeg to process audio files.")
         return None
     except Exception as e:
-        logger.error(f"Error during audio conversion: {str(e)}")
+        logger.error(f"Error during audio decoding: {str(e)}")
         return None
 
 
-def preprocess_audio(audio_path: Path) -> Optional[Path]:
+def iter_audio_blocks(audio_file_path: Union[str, Path],
+                      block_seconds: float = LONG_AUDIO_BLOCK_SECONDS) -> Iterator[np.ndarray]:
     """
-    Pre-processes the audio file to remove noise.
-    Returns the path to the cleaned audio file.
+    Decodes an audio file incrementally into 16 kHz mono float32 blocks of
+    `block_seconds`, so only one block is in memory at a time. 16 kHz mono PCM
+    files are block-read with soundfile; anything else is streamed out of
+    ffmpeg through a pipe. Raises RuntimeError if ffmpeg fails and
+    FileNotFoundError if it isn't installed.
     """
+    audio_file_path = Path(audio_file_path)
+    block_size = int(block_seconds * SAMPLE_RATE)
+    if _is_whisper_ready(audio_file_path):
+        yield from sf.blocks(str(audio_file_path), blocksize=block_size, dtype="float32")
+        return
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", str(audio_file_path),
+           "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     try:
-        # Read the audio file
-        audio_data, sample_rate = sf.read(audio_path)
+        while data := process.stdout.read(block_size * 4):
+            yield np.frombuffer(data, dtype=np.float32)
+        if process.wait() != 0:
+            raise RuntimeError(f"FFmpeg decoding failed: {process.stderr.read().decode(errors='replace')}")
+    finally:
+        # Also runs when the consumer stops early: don't leave ffmpeg blocked on a full pipe
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
 
-        # Perform noise reduction
-        reduced_noise = nr.reduce_noise(y=audio_data, sr=sample_rate, stationary=True)
 
-        # Save the cleaned audio
-        output_path = TEMP_DIR / f"{audio_path.stem}_cleaned.wav"
-        sf.write(output_path, reduced_noise, sample_rate)
-        logger.info(f"Successfully pre-processed audio to remove noise: {output_path}")
-        return output_path
-    except Exception as e:
-        logger.error(f"Error during audio pre-processing: {str(e)}")
+def _as_whisper_audio(audio: np.ndarray) -> np.ndarray:
+    """Converts a recorded array (int or float, mono or multi-channel) to mono float32."""
+    audio = np.asarray(audio)
+    if np.issubdtype(audio.dtype, np.integer):
+        audio = audio / np.iinfo(audio.dtype).max
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return audio.astype(np.float32, copy=False)
+
+
+class NoiseProfile:
+    """Background noise level of a microphone: mean and standard deviation of each STFT bin's magnitude in dB."""
+
+    def __init__(self, mean_db: np.ndarray, std_db: np.ndarray):
+        self.mean_db = mean_db
+        self.std_db = std_db
+
+    @property
+    def threshold_db(self) -> np.ndarray:
+        return self.mean_db + DENOISE_THRESHOLD_STD * self.std_db
+
+
+_noise_profiles = OrderedDict()  # profile key (e.g. Gradio session) -> NoiseProfile, least recently used first
+_noise_profiles_lock = threading.Lock()
+
+
+def get_noise_profile(key: str) -> Optional[NoiseProfile]:
+    with _noise_profiles_lock:
+        profile = _noise_profiles.get(key)
+        if profile is not None:
+            _noise_profiles.move_to_end(key)
+        return profile
+
+
+def _remember_noise_profile(key: str, profile: NoiseProfile):
+    with _noise_profiles_lock:
+        _noise_profiles[key] = profile
+        _noise_profiles.move_to_end(key)
+        while len(_noise_profiles) > NOISE_PROFILE_CACHE_SIZE:
+            _noise_profiles.popitem(last=False)
+
+
+_STFT_WINDOW = np.hanning(DENOISE_N_FFT + 1)[:-1].astype(np.float32)  # Periodic Hann
+
+
+def _stft(audio: np.ndarray) -> np.ndarray:
+    """(frames, bins) spectrum of Hann-windowed frames DENOISE_HOP apart."""
+    frames = np.lib.stride_tricks.sliding_window_view(audio, DENOISE_N_FFT)[::DENOISE_HOP]
+    return np.fft.rfft(frames * _STFT_WINDOW, axis=1).astype(np.complex64, copy=False)
+
+
+def _istft(spectrum: np.ndarray, length: int) -> np.ndarray:
+    """Weighted overlap-add inverse of _stft."""
+    frames = np.fft.irfft(spectrum, n=DENOISE_N_FFT, axis=1).astype(np.float32) * _STFT_WINDOW
+    output = np.zeros(length + DENOISE_N_FFT, dtype=np.float32)
+    weight = np.zeros_like(output)
+    # Frames k, k + 4, k + 8, ... don't overlap, so each phase is one contiguous add
+    for phase in range(DENOISE_N_FFT // DENOISE_HOP):
+        group = frames[phase::DENOISE_N_FFT // DENOISE_HOP]
+        start = phase * DENOISE_HOP
+        output[start:start + group.size] += group.ravel()
+        weight[start:start + group.size] += np.tile(np.square(_STFT_WINDOW), len(group))
+    return output[:length] / np.maximum(weight[:length], 1e-3)
+
+
+def _magnitude_db(spectrum: np.ndarray) -> np.ndarray:
+    return 20 * np.log10(np.abs(spectrum) + 1e-10)
+
+
+def estimate_snr(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> float:
+    """Rough speech-to-noise ratio in dB: loud (90th percentile) frames over quiet (10th percentile) ones."""
+    energy_db, _ = _frame_features(audio, sample_rate * VAD_FRAME_MS // 1000)
+    if not len(energy_db):
+        return 0.0
+    quiet, loud = np.percentile(energy_db, [10, 90])
+    return float(loud - quiet)
+
+
+def estimate_noise_profile(audio: np.ndarray) -> Optional[NoiseProfile]:
+    """Estimates the noise profile from the quietest STFT frames of (at most one block of) the audio."""
+    audio = audio[:DENOISE_BLOCK_SECONDS * SAMPLE_RATE]
+    if len(audio) < DENOISE_N_FFT:
         return None
+    magnitude_db = _magnitude_db(_stft(audio))
+    energy = magnitude_db.mean(axis=1)
+    noise = magnitude_db[energy <= np.percentile(energy, DENOISE_NOISE_PERCENTILE)]
+    return NoiseProfile(noise.mean(axis=0), noise.std(axis=0))
+
+
+def spectral_gate(audio: np.ndarray, profile: NoiseProfile, block_seconds: float = DENOISE_BLOCK_SECONDS) -> np.ndarray:
+    """
+    Attenuates every STFT bin that isn't clearly above the noise profile.
+    The audio is processed in blocks (each overlapping its neighbours by a few
+    frames), so memory stays bounded however long the recording is.
+    """
+    block = max(int(block_seconds * SAMPLE_RATE), DENOISE_N_FFT)
+    pad = DENOISE_N_FFT + DENOISE_SMOOTH_FRAMES * DENOISE_HOP  # Frames and mask smoothing reaching into the neighbours
+    output = np.empty(len(audio), dtype=np.float32)
+    for start in range(0, len(audio), block):
+        end = min(start + block, len(audio))
+        chunk = audio[max(start - pad, 0):min(end + pad, len(audio))]
+        left, right = pad - min(start, pad), pad - min(len(audio) - end, pad)
+        chunk = np.pad(chunk, (left, right))  # Zeros past the ends of the recording
+        spectrum = _stft(chunk)
+        speech = (_magnitude_db(spectrum) > profile.threshold_db).astype(np.float32)
+        spectrum *= uniform_filter(speech, size=(DENOISE_SMOOTH_FRAMES, DENOISE_SMOOTH_BINS))
+        output[start:end] = _istft(spectrum, len(chunk))[pad:pad + end - start]
+    return output
 
 
-def split_audio_into_chunks(audio_path: Path, chunk_duration_ms: int = CHUNK_DURATION_MS) -> list:
+@traced("audio.denoise")
+def preprocess_audio(audio: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                     profile_key: Optional[str] = None) -> Optional[np.ndarray]:
     """
-    Splits the audio file into chunks of specified duration.
-    Returns a list of paths to the chunk files.
+    Removes stationary background noise from the audio, in memory.
+    Returns the cleaned audio as float32.
+
+    Clean recordings (SNR above DENOISE_SKIP_SNR_DB) are returned untouched.
+    The noise profile is estimated from the recording's quiet frames; with a
+    `profile_key` (one per session, i.e. per microphone) it is remembered and
+    reused for recordings without enough pauses to estimate it from.
     """
     try:
-        # Load the audio file using pydub
-        audio = AudioSegment.from_wav(audio_path)
-        duration_ms = len(audio)
-        chunks = []
-
-        for i in range(0, duration_ms, chunk_duration_ms):
-            chunk = audio[i:i + chunk_duration_ms]
-            chunk_path = TEMP_DIR / f"{audio_path.stem}_chunk_{i // chunk_duration_ms}.wav"
-            chunk.export(chunk_path, format="wav")
-            chunks.append(chunk_path)
-            logger.info(f"Created audio chunk: {chunk_path}")
-
-        return chunks
+        with span("audio.snr") as span_args:
+            snr_db = span_args["snr_db"] = round(estimate_snr(audio, sample_rate), 1)
+        audio = audio.astype(np.float32, copy=False)
+        if snr_db >= DENOISE_SKIP_SNR_DB:
+            logger.info(f"Skipping noise reduction; the recording is clean (SNR {snr_db:.0f} dB).")
+            return audio
+
+        profile = get_noise_profile(profile_key) if profile_key else None
+        if profile is None or snr_db >= DENOISE_PROFILE_MIN_SNR_DB:
+            profile = estimate_noise_profile(audio) or profile
+            if profile is None:
+                return audio
+            if profile_key and snr_db >= DENOISE_PROFILE_MIN_SNR_DB:
+                _remember_noise_profile(profile_key, profile)
+        cleaned = spectral_gate(audio, profile)
+        logger.info(f"Successfully pre-processed audio to remove noise (SNR {snr_db:.0f} dB).")
+        return cleaned
     except Exception as e:
-        logger.error(f"Error splitting audio into chunks: {str(e)}")
+        logger.error(f"Error during audio pre-processing: {str(e)}")
+        return None
+
+
+def _frame_features(audio: np.ndarray, frame_length: int) -> tuple:
+    """Per-frame energy (dB) and zero-crossing rate, computed over a (frames, samples) view."""
+    frame_count = len(audio) // frame_length
+    frames = audio[:frame_count * frame_length].reshape(frame_count, frame_length)
+    energy_db = 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-10)
+    zero_crossing_rate = np.mean(np.diff(np.signbit(frames), axis=1), axis=1)
+    return energy_db, zero_crossing_rate
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """(start, end) index pairs of the runs of True in a boolean array."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return edges.reshape(-1, 2)
+
+
+def voiced_frames(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Per-frame (VAD_FRAME_MS) speech decision, before pauses are bridged and blips dropped."""
+    frame_length = sample_rate * VAD_FRAME_MS // 1000
+    if len(audio) < frame_length:
+        return np.zeros(0, dtype=bool)
+    energy_db, zero_crossing_rate = _frame_features(audio, frame_length)
+    # Margin above the noise floor, but no higher than just under the loud frames, so that
+    # recordings that are speech throughout (no silence to measure a floor from) still pass
+    noise_floor, loud = np.percentile(energy_db, [10, 90])
+    threshold = max(min(noise_floor + VAD_ENERGY_MARGIN_DB, loud - VAD_ENERGY_MARGIN_DB), VAD_MIN_ENERGY_DB)
+    return (energy_db > threshold) | (
+        (energy_db > threshold - VAD_ENERGY_MARGIN_DB / 2) & (zero_crossing_rate > VAD_ZCR_THRESHOLD)
+    )
+
+
+def detect_speech(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> list:
+    """
+    Finds the regions of the audio that contain speech.
+    Returns a list of (start_sample, end_sample) pairs in order.
+    """
+    frame_length = sample_rate * VAD_FRAME_MS // 1000
+    speech = voiced_frames(audio, sample_rate)
+    if not len(speech):
         return []
 
+    # Bridge short pauses inside speech, then drop blips that are too short to be words
+    for start, end in _runs(~speech):
+        if start > 0 and end < len(speech) and (end - start) * VAD_FRAME_MS < VAD_MIN_SILENCE_MS:
+            speech[start:end] = True
+    for start, end in _runs(speech):
+        if (end - start) * VAD_FRAME_MS < VAD_MIN_SPEECH_MS:
+            speech[start:end] = False
+
+    padding = VAD_PADDING_MS // VAD_FRAME_MS
+    regions = []
+    for start, end in _runs(speech):
+        start = int(max(start - padding, 0) * frame_length)
+        end = int(min((end + padding) * frame_length, len(audio)))
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)  # Padding made them touch
+        else:
+            regions.append((start, end))
+    return regions
+
 
-def transcribe_audio(audio_file_path: Union[str, Path]) -> str:
+def _quietest_split(audio: np.ndarray, start: int, end: int, sample_rate: int) -> int:
+    """Sample index of the quietest frame in the last 5 seconds before `end`, to split overlong speech."""
+    frame_length = sample_rate * VAD_FRAME_MS // 1000
+    search_start = max(start + frame_length, end - 5 * sample_rate)
+    energy_db, _ = _frame_features(audio[search_start:end], frame_length)
+    if not len(energy_db):
+        return end
+    return search_start + int(np.argmin(energy_db)) * frame_length
+
+
+@traced("audio.vad")
+def speech_windows(audio: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                   max_seconds: float = STT_WINDOW_SECONDS) -> list:
     """
-    Transcribes an audio file to text using Whisper or fallback method.
-    Processes the audio in chunks to reduce latency.
+    Packs the detected speech regions into as few windows of up to `max_seconds`
+    as possible, cutting only at pauses, so each Whisper call gets a full window
+    of speech and no call is spent on silence. Speech that runs longer than a
+    window without pausing is cut at its quietest point.
+    Returns a list of (start_sample, end_sample) pairs.
     """
-    global _stt_model
-    valid_audio_path = ensure_valid_audio(audio_file_path)
-    if not valid_audio_path:
-        return "Error: Could not process the audio file. Please check the file format and ensure FFmpeg is installed."
+    return pack_speech_regions(audio, detect_speech(audio, sample_rate), sample_rate, max_seconds)
 
-    # Pre-process the audio to remove noise
-    cleaned_audio_path = preprocess_audio(valid_audio_path)
-    if not cleaned_audio_path:
-        return "Error: Could not pre-process the audio file to remove noise."
 
-    if WHISPER_AVAILABLE:
+def pack_speech_regions(audio: np.ndarray, regions: list, sample_rate: int = SAMPLE_RATE,
+                        max_seconds: float = STT_WINDOW_SECONDS) -> list:
+    """Packs (start, end) speech regions into windows; see speech_windows."""
+    max_length = int(max_seconds * sample_rate)
+    windows = []
+    for start, end in regions:
+        if windows and end - windows[-1][0] <= max_length:
+            windows[-1] = (windows[-1][0], end)
+            continue
+        while end - start > max_length:
+            split = _quietest_split(audio, start, start + max_length, sample_rate)
+            windows.append((start, split))
+            start = split
+        windows.append((start, end))
+    return windows
+
+
+class STTBackend:
+    """
+    A speech-to-text engine. Each instance holds one loaded model and is only
+    ever used by one thread at a time.
+
+    `transcribe` takes 16 kHz mono float32 audio and returns segments
+    [{"start", "end", "text"}], with times in seconds from the start of the audio.
+    """
+
+    name = None
+    available = False
+
+    def __init__(self, model_name: str = WHISPER_MODEL):
+        self.model_name = model_name
+        self.model = None
+
+    def load(self):
+        raise NotImplementedError
+
+    def transcribe(self, audio: np.ndarray) -> list:
+        raise NotImplementedError
+
+    def options(self) -> dict:
+        """Everything besides the audio that affects the transcript; part of the transcript cache key."""
+        return {"backend": self.name, "model": self.model_name}
+
+    def warmup(self, seconds: float = STT_WARMUP_SECONDS):
+        """Runs one throwaway transcription so the first real request doesn't pay for lazy initialization."""
+        if seconds:
+            self.transcribe(np.zeros(int(SAMPLE_RATE * seconds), dtype=np.float32))
+
+
+class WhisperBackend(STTBackend):
+    """openai-whisper (PyTorch, fp32 on CPU)."""
+
+    name = "whisper"
+    available = WHISPER_AVAILABLE
+
+    def load(self):
+        self.model = whisper.load_model(self.model_name)
+        if STT_CPU_THREADS and self.model.device.type == "cpu":
+            import torch
+            torch.set_num_threads(STT_CPU_THREADS)
+
+    def transcribe(self, audio: np.ndarray) -> list:
+        result = self.model.transcribe(audio, fp16=self.model.device.type != "cpu")
+        segments = result.get("segments") or [{"start": 0.0, "end": len(audio) / SAMPLE_RATE, "text": result["text"]}]
+        return [{"start": segment["start"], "end": segment["end"], "text": segment["text"]} for segment in segments]
+
+
+class FasterWhisperBackend(STTBackend):
+    """faster-whisper (CTranslate2), int8-quantized for CPU inference by default."""
+
+    name = "faster-whisper"
+    available = FASTER_WHISPER_AVAILABLE
+
+    def load(self):
+        self.model = WhisperModel(self.model_name, device=FASTER_WHISPER_DEVICE,
+                                  compute_type=FASTER_WHISPER_COMPUTE_TYPE, cpu_threads=STT_CPU_THREADS)
+
+    def options(self) -> dict:
+        return {**super().options(), "compute_type": FASTER_WHISPER_COMPUTE_TYPE, "beam_size": 1}
+
+    def transcribe(self, audio: np.ndarray) -> list:
+        # Greedy decoding like openai-whisper's default; speech is already segmented by our own VAD
+        segments, _ = self.model.transcribe(audio, beam_size=1, vad_filter=False)
+        return [{"start": segment.start, "end": segment.end, "text": segment.text} for segment in segments]
+
+
+STT_BACKENDS = {backend.name: backend for backend in (WhisperBackend, FasterWhisperBackend)}
+
+
+def create_stt_backend(name: str = STT_BACKEND, model_name: str = WHISPER_MODEL) -> STTBackend:
+    """Returns an unloaded instance of the named backend. Raises ValueError for unknown names."""
+    try:
+        return STT_BACKENDS[name](model_name)
+    except KeyError:
+        raise ValueError(f"Unknown STT backend {name!r}; choose one of {', '.join(STT_BACKENDS)}.") from None
+
+
+def stt_available(name: str = STT_BACKEND) -> bool:
+    backend = STT_BACKENDS.get(name)
+    return backend is not None and backend.available
+
+
+class SpeechToTextService:
+    """
+    Transcribes audio on a fixed set of worker threads, each with its own
+    preloaded STT backend instance, so no request pays for the model load and
+    no two requests ever share a model instance.
+
+    Jobs wait in a bounded FIFO queue. `submit` returns a
+    concurrent.futures.Future for the backend's list of segments.
+    """
+
+    def __init__(self, backend: str = STT_BACKEND, model_name: str = WHISPER_MODEL, workers: int = STT_WORKERS,
+                 max_queue_size: int = STT_QUEUE_SIZE):
+        self.backend = backend
+        self.model_name = model_name
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._threads = []
+        self._loading = workers
+        self._ready = threading.Event()  # Set once every worker has tried to load its model
+        self._lock = threading.Lock()
+        self._models_loaded = 0
+        self._busy = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+        self._total_audio = 0.0
+
+    def start(self):
+        """Starts the workers, which load and warm up their models in the background (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                worker = threading.Thread(target=self._worker, name=f"stt-worker-{i}", daemon=True)
+                worker.start()
+                self._threads.append(worker)
+        logger.info(f"Speech-to-text service starting {self.workers} x {self.backend} {self.model_name}.")
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Blocks until every worker has loaded its model (or failed to). Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    def _load_backend(self) -> STTBackend:
+        started = time.monotonic()
+        backend = create_stt_backend(self.backend, self.model_name)
+        backend.load()
+        backend.warmup()
+        logger.info(f"Loaded and warmed up {self.backend} model {self.model_name} in {time.monotonic() - started:.1f}s")
+        return backend
+
+    def _worker(self):
         try:
-            if _stt_model is None:
-                logger.info(f"Loading Whisper model: {DEFAULT_WHISPER_MODEL}")
-                _stt_model = whisper.load_model(DEFAULT_WHISPER_MODEL)
-
-            # Split the cleaned audio into chunks
-            chunks = split_audio_into_chunks(cleaned_audio_path)
-            if not chunks:
-                return "Error: Could not split audio into chunks for transcription."
-
-            # Transcribe each chunk
-            transcribed_text = []
-            for chunk_path in chunks:
-                logger.info(f"Transcribing audio chunk: {chunk_path}")
-                result = _stt_model.transcribe(str(chunk_path))
-                chunk_text = result["text"].strip()
-                if chunk_text:
-                    transcribed_text.append(chunk_text)
-
-            # Combine the transcribed text from all chunks
-            full_text = " ".join(transcribed_text).strip()
-            if not full_text:
-                return "No speech detected in the audio."
-            return full_text
+            backend = self._load_backend()
+            with self._lock:
+                self._models_loaded += 1
         except Exception as e:
-            logger.error(f"Whisper transcription error: {str(e)}")
-            return f"Error transcribing audio: {str(e)}"
-    else:
-        return "Transcription service not available. Please install Whisper or configure an alternative service."
+            logger.error(f"Could not load {self.backend} model {self.model_name}: {str(e)}")
+            backend = None
+        finally:
+            with self._lock:
+                self._loading -= 1
+                if self._loading == 0:
+                    self._ready.set()
+
+        while True:
+            job = self._queue.get()
+            if job is None:  # Shutdown sentinel
+                return
+            audio, enqueued_at, future, context = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.monotonic()
+            STT_QUEUE_WAIT.observe(started - enqueued_at)
+            context.run(record_span, "stt.queue_wait", enqueued_at, started)
+            with self._lock:
+                self._busy += 1
+                self._total_wait += started - enqueued_at
+            try:
+                if backend is None:
+                    raise RuntimeError(f"The {self.backend} model {self.model_name} failed to load.")
+                result = context.run(self._transcribe, backend, audio)
+                failed = False
+                future.set_result(result)
+            except BaseException as e:
+                failed = True
+                future.set_exception(e)
+            finally:
+                elapsed = time.monotonic() - started
+                audio_seconds = len(audio) / SAMPLE_RATE
+                STT_JOB_DURATION.observe(elapsed)
+                if audio_seconds:
+                    STT_REALTIME_FACTOR.observe(elapsed / audio_seconds)
+                with self._lock:
+                    self._busy -= 1
+                    self._completed += 1
+                    self._failed += failed
+                    self._total_run += elapsed
+                    self._total_audio += audio_seconds
 
+    def _transcribe(self, backend: STTBackend, audio: np.ndarray) -> list:
+        with span("stt.transcribe", backend=self.backend, seconds=round(len(audio) / SAMPLE_RATE, 2)):
+            return backend.transcribe(audio)
 
-def process_voice_input(audio_data: Union[str, Path, np.ndarray]) -> dict:
+    def submit(self, audio: np.ndarray, timeout: float = STT_SUBMIT_TIMEOUT) -> Future:
+        """
+        Queues 16 kHz float32 audio for transcription and returns a Future for
+        its segments. Raises queue.Full if no queue slot frees up in time.
+        """
+        self.start()
+        future = Future()
+        try:
+            self._queue.put((audio, time.monotonic(), future, contextvars.copy_context()), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise
+        return future
+
+    def transcribe(self, audio: np.ndarray) -> list:
+        """Transcribes the audio on the next free model instance and waits for the result."""
+        return self.submit(audio).result()
+
+    def metrics(self) -> dict:
+        """Returns a snapshot of queue depth, busy workers and per-job timings."""
+        with self._lock:
+            return {
+                "models_loaded": self._models_loaded,
+                "queue_depth": self._queue.qsize(),
+                "busy_workers": self._busy,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": self._total_wait / self._completed if self._completed else 0.0,
+                "avg_job_seconds": self._total_run / self._completed if self._completed else 0.0,
+                "realtime_factor": self._total_run / self._total_audio if self._total_audio else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stops the workers once the jobs already queued have run."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+_stt_service = None
+_stt_service_lock = threading.Lock()
+
+
+def get_stt_service() -> SpeechToTextService:
+    """Returns the process-wide speech-to-text service, starting it on first use."""
+    global _stt_service
+    with _stt_service_lock:
+        if _stt_service is None:
+            _stt_service = SpeechToTextService()
+            _stt_service.start()
+        return _stt_service
+
+
+def start_stt_service(wait: bool = False) -> Optional[SpeechToTextService]:
+    """Preloads and warms up the STT models; call once at app startup."""
+    if not stt_available():
+        logger.warning(f"STT backend {STT_BACKEND!r} is not installed; voice input is disabled.")
+        return None
+    service = get_stt_service()
+    if wait:
+        service.wait_ready()
+    return service
+
+
+def _stt_metric(name: str):
+    return _stt_service.metrics()[name] if _stt_service is not None else None
+
+
+REGISTRY.gauge("stt_queue_depth", "Transcription jobs waiting for a model instance.", lambda: _stt_metric("queue_depth"))
+REGISTRY.gauge("stt_busy_workers", "Model instances currently transcribing.", lambda: _stt_metric("busy_workers"))
+REGISTRY.gauge("stt_models_loaded", "STT model instances loaded and warmed up.", lambda: _stt_metric("models_loaded"))
+
+
+# --------------------------
+# TRANSCRIPT CACHE
+# --------------------------
+# ✅ Successful transcripts only; "Error: ..." results are never cached
+transcript_cache = TieredCache(
+    memory_bytes=TRANSCRIPT_CACHE_MEMORY_BYTES,
+    disk_path=TRANSCRIPT_CACHE_PATH,
+    disk_bytes=TRANSCRIPT_CACHE_DISK_BYTES,
+    ttl=TRANSCRIPT_CACHE_TTL_SECONDS,
+)
+
+
+def _hashed_blocks(blocks: Iterable[np.ndarray], digest) -> Iterator[np.ndarray]:
+    """Passes decoded 16 kHz blocks through, feeding each one's float32 PCM into `digest`."""
+    for block in blocks:
+        digest.update(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+        yield block
+
+
+def _pcm_hash(blocks: Iterable[np.ndarray]) -> str:
     """
-    High-level function to process voice input and return results.
+    sha256 of decoded 16 kHz float32 PCM, fed block by block; the same digest
+    as hashing the whole recording at once, so both transcription paths agree.
     """
-    if isinstance(audio_data, np.ndarray):
-        temp_path = TEMP_DIR / f"temp_recording_{int(time.time())}.wav"
-        try:
-            import soundfile as sf
-            sf.write(str(temp_path), audio_data, 16000)
-            audio_path = temp_path
-        except ImportError:
-            return {"success": False,
-                    "transcription": "Error: soundfile library not available for processing audio data."}
+    digest = hashlib.sha256()
+    for _ in _hashed_blocks(blocks, digest):
+        pass
+    return digest.hexdigest()
+
+
+def _file_hash(path: Path) -> str:
+    """sha256 of a file's bytes, read 1 MB at a time and prefixed so it never matches a _pcm_hash."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return "file:" + digest.hexdigest()
+
+
+def _transcript_cache_key(pcm_hash: str) -> str:
+    """
+    Combines the hash of the decoded PCM (see _pcm_hash) with the STT backend,
+    model and the front-end settings (denoising, VAD, windowing), so the same
+    recording gets the same key whatever file name or container it was
+    uploaded in, and whether it was transcribed whole or streamed. Transcripts
+    of files are also stored under their _file_hash, which can be looked up
+    before decoding.
+    """
+    front_end = {
+        "window_seconds": STT_WINDOW_SECONDS,
+        "vad": [VAD_FRAME_MS, VAD_ENERGY_MARGIN_DB, VAD_MIN_ENERGY_DB, VAD_ZCR_THRESHOLD,
+                VAD_MIN_SILENCE_MS, VAD_MIN_SPEECH_MS, VAD_PADDING_MS],
+        "result": ["segments", "analytics"],
+        "denoise": [DENOISE_SKIP_SNR_DB, DENOISE_N_FFT, DENOISE_THRESHOLD_STD, DENOISE_SMOOTH_FRAMES, DENOISE_SMOOTH_BINS],
+    }
+    return make_cache_key(pcm_hash, create_stt_backend().options(), front_end)
+
+
+def _cached_transcript(cache_key: str) -> Optional[dict]:
+    with span("stt.cache_lookup") as span_args:
+        cached = transcript_cache.get(cache_key)
+        span_args["hit"] = cached is not None
+    STT_CACHE_REQUESTS.inc(result="hit" if cached is not None else "miss")
+    return json.loads(cached) if cached is not None else None
+
+
+REGISTRY.gauge("stt_transcript_cache_hit_rate", "Transcript cache hit rate since startup.",
+               lambda: transcript_cache.stats()["hit_rate"])
+
+
+def _offset_segments(segments: list, offset: float) -> list:
+    """Shifts a window's segments to times from the start of the recording, dropping empty ones."""
+    return [
+        {"start": round(offset + segment["start"], 2), "end": round(offset + segment["end"], 2),
+         "text": segment["text"].strip()}
+        for segment in segments if segment["text"].strip()
+    ]
+
+
+@traced("audio.transcribe")
+def transcribe_audio_detailed(audio_input: Union[str, Path, np.ndarray], profile_key: Optional[str] = None) -> dict:
+    """
+    Transcribes an audio file (or a 16 kHz audio array) with the STT_BACKEND.
+    The audio is decoded once and stays in memory. Silence is skipped, and the
+    speech is transcribed in windows of up to STT_WINDOW_SECONDS cut at pauses.
+
+    Returns {"text", "segments", "duration"}: the transcript (or an "Error: ..."
+    message), timestamped segments [{"start", "end", "text"}] in seconds from the
+    start of the recording, and the recording length in seconds. Transcripts
+    also carry "analytics", the delivery metrics from speech_analytics. `profile_key`
+    identifies the microphone (e.g. the Gradio session) so its noise profile is
+    reused; see preprocess_audio.
+    """
+    def failure(message: str) -> dict:
+        return {"text": message, "segments": [], "duration": 0.0}
+
+    cache_keys = []
+    if isinstance(audio_input, np.ndarray):
+        audio = _as_whisper_audio(audio_input)
     else:
-        audio_path = audio_data
-    transcription = transcribe_audio(audio_path)
-    return {"success": not transcription.startswith("Error:"), "transcription": transcription}
+        audio = load_audio(audio_input)
+        if audio is not None:
+            cache_keys.append(_transcript_cache_key(_file_hash(Path(audio_input))))
+    if audio is None:
+        return failure("Error: Could not process the audio file. Please check the file format and ensure FFmpeg is installed.")
+
+    # Re-submitted recordings (retries, the same file in another tab) skip denoising and STT
+    cache_key = _transcript_cache_key(_pcm_hash([audio]))
+    cache_keys.append(cache_key)
+    cached = _cached_transcript(cache_key)
+    if cached is not None:
+        logger.info(f"Transcript cache hit ({cached['duration']:.1f}s of audio).")
+        return cached
+
+    # Pre-process the audio to remove noise
+    cleaned_audio = preprocess_audio(audio, profile_key=profile_key)
+    if cleaned_audio is None:
+        return failure("Error: Could not pre-process the audio file to remove noise.")
+    duration = len(cleaned_audio) / SAMPLE_RATE
 
+    if not stt_available():
+        return failure("Transcription service not available. Please install Whisper or configure an alternative service.")
+    try:
+        windows = speech_windows(cleaned_audio)
+        if not windows:
+            return {"text": "No speech detected in the audio.", "segments": [], "duration": duration}
+
+        # Queue every window at once; with several model instances they run in parallel
+        service = get_stt_service()
+        futures = []
+        try:
+            for start, end in windows:
+                futures.append(service.submit(cleaned_audio[start:end]))
+        except queue.Full:
+            for future in futures:
+                future.cancel()
+            raise
+        segments = []
+        for i, ((start, end), future) in enumerate(zip(windows, futures)):
+            logger.info(f"Transcribing speech window {i + 1}/{len(windows)} ({start / SAMPLE_RATE:.1f}s-{end / SAMPLE_RATE:.1f}s)")
+            segments.extend(_offset_segments(future.result(), start / SAMPLE_RATE))
+
+        full_text = " ".join(segment["text"] for segment in segments).strip()
+        if not full_text:
+            return {"text": "No speech detected in the audio.", "segments": [], "duration": duration}
+        analytics = analyze_speech(full_text, segments, voiced_frames(cleaned_audio), VAD_FRAME_MS / 1000)
+        result = {"text": full_text, "segments": segments, "duration": duration, "analytics": analytics}
+        for key in cache_keys:
+            transcript_cache.set(key, json.dumps(result))
+        return result
+    except queue.Full:
+        logger.error("Transcription queue is full; rejecting request.")
+        return failure("Error: The transcription service is busy right now. Please try again in a moment.")
+    except Exception as e:
+        logger.error(f"Transcription error: {str(e)}")
+        return failure(f"Error transcribing audio: {str(e)}")
+
+
+def transcribe_audio(audio_input: Union[str, Path, np.ndarray], profile_key: Optional[str] = None) -> str:
+    """
+    Transcribes an audio file (or a 16 kHz audio array) to text using Whisper or
+    fallback method. See transcribe_audio_detailed for timestamps.
+    """
+    return transcribe_audio_detailed(audio_input, profile_key)["text"]
+
+
+class _StreamResampler:
+    """
+    Resamples a stream chunk by chunk to the same samples resample_poly gives
+    for the whole stream. Each call filters a short tail of the earlier input
+    along with the new chunk and only returns output whose filter window is
+    complete, so chunk boundaries leave no edge artifacts; flush() returns the
+    rest at the end of the stream.
+    """
+
+    def __init__(self, rate_in: int, rate_out: int = SAMPLE_RATE):
+        factor = gcd(rate_out, rate_in)
+        self.rate_in = rate_in
+        self.up, self.down = rate_out // factor, rate_in // factor
+        self.half_len = 10 * max(self.up, self.down)  # resample_poly's filter half-length (upsampled samples)
+        self._input = np.zeros(0, dtype=np.float32)
+        self._start = 0  # Stream index of _input[0]; a multiple of `down`, so outputs line up
+        self._emitted = 0  # Output samples returned so far
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """Returns the output samples the input so far fully determines."""
+        self._input = np.concatenate([self._input, audio])
+        end = self._start + len(self._input)
+        return self._emit(((end - 1) * self.up - self.half_len) // self.down + 1)
+
+    def flush(self) -> np.ndarray:
+        """Returns the remaining output, as if the stream were zero-padded like resample_poly pads it."""
+        end = self._start + len(self._input)
+        return self._emit(-(-end * self.up // self.down))
+
+    def _emit(self, stop: int) -> np.ndarray:
+        if stop <= self._emitted:
+            return np.zeros(0, dtype=np.float32)
+        first = self._start * self.up // self.down
+        resampled = resample_poly(self._input, self.up, self.down)[self._emitted - first:stop - first]
+        self._emitted = stop
+        # Keep only the input that the filter windows of later outputs still reach back into
+        keep = max(0, (self._emitted * self.down - self.half_len) // self.up - 1)
+        keep -= keep % self.down
+        if keep > self._start:
+            self._input = self._input[keep - self._start:]
+            self._start = keep
+        return resampled.astype(np.float32)
+
+
+class StreamingTranscriber:
+    """
+    Transcribes a live microphone stream while the user is still speaking.
+
+    Frames are resampled to 16 kHz (with the resampler's state carried across
+    frames) and appended to a fixed-size buffer of uncommitted audio. Once the VAD sees enough speech that has ended in a
+    pause, that speech is committed: it is denoised, queued on the STT service
+    and dropped from the buffer. When recording stops, finish() only has the
+    uncommitted tail left to transcribe. One instance per recording; not
+    thread-safe (Gradio delivers a session's stream events in order).
+
+    With `commit_seconds=None` speech is only committed when the buffer is
+    full, as windows packed up to STT_WINDOW_SECONDS; `max_pending` bounds the
+    windows queued for STT at once (the caller waits for the oldest).
+    stream_transcription uses both to feed recorded files through.
+    """
+
+    def __init__(self, profile_key: Optional[str] = None, commit_seconds: Optional[float] = STREAM_COMMIT_SECONDS,
+                 max_pending: Optional[int] = None):
+        self.profile_key = profile_key  # Noise profile to reuse, see preprocess_audio
+        self.commit_seconds = commit_seconds
+        self.max_pending = max_pending
+        self._buffer = np.zeros(int(STREAM_BUFFER_SECONDS * SAMPLE_RATE), dtype=np.float32)
+        self._length = 0  # Uncommitted samples held in the buffer
+        self._offset = 0  # Samples dropped from the front of the stream so far
+        self._pending = []  # (offset seconds, Future) of committed speech, in order
+        self._resampler = None  # For streams that aren't 16 kHz
+        self.segments = []
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        return (self._offset + self._length) / SAMPLE_RATE
 
-def cleanup_temp_files(max_age_hours: int = 24):
-    """Removes temporary files older than the specified age"""
-    current_time = time.time()
-    for file_path in TEMP_DIR.glob("*"):
-        file_age_hours = (current_time - file_path.stat().st_mtime) / 3600
-        if file_age_hours > max_age_hours:
+    @property
+    def text(self) -> str:
+        """The transcript so far."""
+        return " ".join(segment["text"] for segment in self.segments)
+
+    def add_frames(self, sample_rate: int, frames: np.ndarray) -> str:
+        """Adds a chunk of streamed audio and returns the partial transcript."""
+        audio = _as_whisper_audio(frames)
+        if sample_rate != SAMPLE_RATE:
+            if self._resampler is None or self._resampler.rate_in != sample_rate:
+                if self._resampler is not None:
+                    self._append(self._resampler.flush())
+                self._resampler = _StreamResampler(sample_rate)
+            audio = self._resampler.process(audio)
+        self._append(audio)
+        self._commit()
+        self._collect()
+        return self.text
+
+    def _append(self, audio: np.ndarray):
+        """Copies 16 kHz audio into the buffer, committing windows whenever it fills up."""
+        while len(audio):
+            if self._length == len(self._buffer):
+                self._commit(force=True)
+            chunk = audio[:len(self._buffer) - self._length]
+            self._buffer[self._length:self._length + len(chunk)] = chunk
+            self._length += len(chunk)
+            audio = audio[len(chunk):]
+
+    def finish(self) -> dict:
+        """
+        Transcribes the remaining audio and waits for every committed segment.
+        Returns {"text", "segments", "duration"} like transcribe_audio_detailed.
+        """
+        if self._resampler is not None:
+            self._append(self._resampler.flush())
+        self._commit(final=True)
+        self._collect(wait=True)
+        if self.error:
+            return {"text": self.error, "segments": [], "duration": self.duration}
+        if not self.segments:
+            return {"text": "No speech detected in the audio.", "segments": [], "duration": self.duration}
+        # The audio is gone by now, so pauses are measured between segments only
+        return {"text": self.text, "segments": self.segments, "duration": self.duration,
+                "analytics": analyze_speech(self.text, self.segments)}
+
+    def _commit(self, final: bool = False, force: bool = False):
+        """
+        Queues finished speech for transcription. `final` commits everything;
+        `force` (buffer full) commits all but the last, still growing window.
+        """
+        audio = self._buffer[:self._length]
+        regions = detect_speech(audio)
+        if not regions:
+            # Only silence so far: keep a short tail so the next word's onset isn't lost
+            self._drop(self._length - min(self._length, SAMPLE_RATE // 2))
+            return
+        if final:
+            windows, cut = pack_speech_regions(audio, regions), self._length
+        elif force:
+            windows = pack_speech_regions(audio, regions)
+            windows, cut = (windows[:-1], windows[-1][0]) if len(windows) > 1 else (windows, self._length)
+        elif self.commit_seconds is None:
+            return
+        else:
+            pause = STREAM_PAUSE_MS * SAMPLE_RATE // 1000
+            finished = [region for region in regions if region[1] <= self._length - pause]
+            if not finished or finished[-1][1] - finished[0][0] < self.commit_seconds * SAMPLE_RATE:
+                return
+            windows, cut = pack_speech_regions(audio, finished), finished[-1][1]
+
+        for start, end in windows:
+            segment_audio = audio[start:end].copy()  # The buffer is reused while the job waits in the queue
+            cleaned = preprocess_audio(segment_audio, profile_key=self.profile_key)
+            if cleaned is not None:
+                segment_audio = cleaned
+            if self.max_pending and len(self._pending) >= self.max_pending:
+                wait([self._pending[0][1]])
+                self._collect()
+            try:
+                future = get_stt_service().submit(segment_audio)
+            except queue.Full:
+                logger.error("Transcription queue is full; dropping live audio.")
+                self.error = "Error: The transcription service is busy right now. Please try again in a moment."
+                continue
+            self._pending.append(((self._offset + start) / SAMPLE_RATE, future))
+        self._drop(cut)
+
+    def cancel(self):
+        """Drops the windows still waiting for a model instance."""
+        for _, future in self._pending:
+            future.cancel()
+        self._pending = [(offset, future) for offset, future in self._pending if not future.cancelled()]
+
+    def _drop(self, samples: int):
+        """Drops committed (or silent) samples from the front of the buffer."""
+        if samples <= 0:
+            return
+        remaining = self._length - samples
+        self._buffer[:remaining] = self._buffer[samples:self._length]
+        self._length = remaining
+        self._offset += samples
+
+    def _collect(self, wait: bool = False):
+        """Moves finished transcriptions, in order, into the transcript."""
+        while self._pending and (wait or self._pending[0][1].done()):
+            offset, future = self._pending.pop(0)
             try:
-                os.remove(file_path)
-                logger.info(f"Removed old temporary file: {file_path}")
+                self.segments.extend(_offset_segments(future.result(), offset))
             except Exception as e:
-                logger.error(f"Failed to remove temporary file {file_path}: {str(e)}")
+                logger.error(f"Transcription error: {str(e)}")
+                self.error = f"Error transcribing audio: {str(e)}"
 
 
-import time
+def stream_transcription(audio_input: Union[str, Path], profile_key: Optional[str] = None) -> Iterator[dict]:
+    """
+    Transcribes a recording of any length with flat memory use. Yields the
+    transcript so far ({"text", "segments", "duration"}, like
+    transcribe_audio_detailed) each time new segments are ready; the last
+    result is the complete transcript, or a single "Error: ..." result.
+
+    A file transcribed before (streamed or through transcribe_audio_detailed)
+    is recognised by the hash of its bytes and comes straight from the
+    transcript cache without being decoded. Otherwise it is decoded once,
+    LONG_AUDIO_BLOCK_SECONDS at a time, and each block is hashed on its way
+    into a StreamingTranscriber, whose window of uncommitted audio slides
+    along the recording: speech is cut into windows of up to
+    STT_WINDOW_SECONDS at pauses, the unfinished tail carries over into the
+    next block, and decoding waits while the STT queue already holds a window
+    per model instance. The complete transcript is cached under both the file
+    and the PCM hash, so the same recording in another container also hits.
+    """
+    def failure(message: str) -> dict:
+        return {"text": message, "segments": [], "duration": 0.0}
+
+    audio_file_path = Path(audio_input)
+    if not audio_file_path.exists() or audio_file_path.stat().st_size == 0:
+        logger.error(f"Audio file not found or empty: {audio_file_path}")
+        yield failure("Error: Could not process the audio file. Please check the file format and ensure FFmpeg is installed.")
+        return
+
+    transcriber = StreamingTranscriber(profile_key, commit_seconds=None, max_pending=STT_WORKERS + 1)
+    reported = 0
+    try:
+        file_key = _transcript_cache_key(_file_hash(audio_file_path))
+        result = _cached_transcript(file_key)
+        if result is not None:
+            logger.info(f"Transcript cache hit ({result['duration']:.1f}s of audio).")
+        elif not stt_available():
+            result = failure("Transcription service not available. Please install Whisper or configure an alternative service.")
+        else:
+            pcm_digest = hashlib.sha256()
+            for block in _hashed_blocks(iter_audio_blocks(audio_file_path), pcm_digest):
+                transcriber.add_frames(SAMPLE_RATE, block)
+                if transcriber.error:
+                    break
+                if len(transcriber.segments) > reported:
+                    reported = len(transcriber.segments)
+                    yield {"text": transcriber.text, "segments": list(transcriber.segments), "duration": transcriber.duration}
+            result = transcriber.finish()
+            if result["segments"]:  # Only complete transcripts; errors and silence aren't cached
+                for key in (file_key, _transcript_cache_key(pcm_digest.hexdigest())):
+                    transcript_cache.set(key, json.dumps(result))
+    except FileNotFoundError:
+        logger.error("FFmpeg is not installed or not found in PATH. Please install FFmpeg to process audio files.")
+        result = failure("Error: Could not process the audio file. Please check the file format and ensure FFmpeg is installed.")
+    except Exception as e:
+        logger.error(f"Error during long audio transcription: {str(e)}")
+        result = failure(f"Error transcribing audio: {str(e)}")
+    finally:
+        transcriber.cancel()  # Nothing is left after finish(); on errors or an abandoned stream, free the queue
+    yield result
 
 
-def schedule_cleanup():
-    cleanup_temp_files()
-    threading.Timer(6 * 60 * 60, schedule_cleanup).start()
\ No newline at end of file
+def process_voice_input(audio_data: Union[str, Path, np.ndarray]) -> dict:
+    """
+    High-level function to process voice input and return results.
+    Arrays are expected at 16 kHz and are transcribed without touching the disk.
+    """
+    transcription = transcribe_audio(audio_data)
+    return {"success": not transcription.startswith("Error:"), "transcription": transcription}
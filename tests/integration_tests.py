@@ -1,28 +1,46 @@
+import asyncio
 import unittest
 from unittest.mock import patch
+import main
 from main import chat_with_coach_text, skill_training_text, presentation_assessment_text
 
 
+async def _async_iter(items):
+    for item in items:
+        yield item
+
+
+def _collect(handler, *args):
+    """Runs an async generator handler to completion, snapshotting each yielded history."""
+    async def run():
+        return [[dict(message) for message in history] async for history in handler(*args)]
+    return asyncio.run(run())
+
+
 class TestUserFlow(unittest.TestCase):
-    @patch("src.main.get_chat_feedback")
+    @patch("main.stream_chat_feedback")
     def test_chat_flow(self, mock_chat_feedback):
         """Test chat interaction with the AI coach."""
-        mock_chat_feedback.return_value = "AI-generated response"
-        history = chat_with_coach_text("Hello, Coach!", [])
-        self.assertEqual(history[-1]["content"], "AI-generated response")
+        mock_chat_feedback.return_value = _async_iter(["AI-generated", "AI-generated response"])
+        updates = _collect(chat_with_coach_text, "Hello, Coach!", [])
+        self.assertEqual(updates[0][-1]["content"], "Thinking...")  # Placeholder shown before the first token
+        self.assertEqual(updates[-1][-1]["content"], "AI-generated response")
 
-    @patch("src.skill_training.run_impromptu_speaking")
-    def test_skill_training_flow(self, mock_training_feedback):
+    @patch("main.update_tracking")
+    @patch("main.stream_skill_evaluation")
+    def test_skill_training_flow(self, mock_training_feedback, mock_update_tracking):
         """Test the skill training process."""
-        mock_training_feedback.return_value = {"challenge": "Test challenge", "evaluation": "Great job!"}
-        history = skill_training_text("Impromptu Speaking", "User response", [])
+        main.selected_challenge, main.selected_time_limit = "Test challenge", 60
+        mock_training_feedback.return_value = _async_iter([{"challenge": "Test challenge", "evaluation": "Great job!", "average_score": 8.0}])
+        history = _collect(skill_training_text, "Impromptu Speaking", "User response", [])[-1]
         self.assertEqual(history[-1]["content"], "‍🏫 **Coach:**\n**🔹 Topic:** Test challenge\n\n### 📌 **LLM Evaluation**\nGreat job!")
+        mock_update_tracking.assert_called_once()
 
-    @patch("src.presentation_assessment.assess_presentation")
+    @patch("main.stream_presentation_assessment")
     def test_presentation_assessment_flow(self, mock_presentation_feedback):
         """Test the presentation assessment process."""
-        mock_presentation_feedback.return_value = {"raw_feedback": "Your speech was well-structured."}
-        history = presentation_assessment_text("My presentation content", [])
+        mock_presentation_feedback.return_value = _async_iter([{"raw_feedback": "Your speech was well-structured."}])
+        history = _collect(presentation_assessment_text, "My presentation content", [])[-1]
         self.assertIn("Your speech was well-structured.", history[-1]["content"])
 
 